@@ -1,18 +1,50 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Product, Order, OrderItem, Customer
+from django.db import transaction
+from .models import User, Product, Order, OrderItem, Customer, CashLedgerEntry, InventoryMovement
+from .rollups import CUSTOMER_TOTAL_FIELDS
+from .stock import record_stock_change
 
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ('name', 'phone_number', 'address')
     search_fields = ('name', 'phone_number')
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        with transaction.atomic():
+            current = Customer.objects.select_for_update().only(*CUSTOMER_TOTAL_FIELDS).get(pk=obj.pk)
+            for field in CUSTOMER_TOTAL_FIELDS:
+                setattr(obj, field, getattr(current, field))
+            super().save_model(request, obj, form, change)
+
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'role', 'is_staff')
+    list_display = ('username', 'email', 'role', 'cash_on_hand', 'is_staff')
     fieldsets = UserAdmin.fieldsets + (
-        ('Role Info', {'fields': ('role',)}),
+        ('Role Info', {'fields': ('role', 'cash_on_hand')}),
     )
+    readonly_fields = ('cash_on_hand',)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        with transaction.atomic():
+            obj.cash_on_hand = User.objects.select_for_update().only('cash_on_hand').get(pk=obj.pk).cash_on_hand
+            super().save_model(request, obj, form, change)
+
+@admin.register(CashLedgerEntry)
+class CashLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'kind', 'amount', 'balance_after', 'order', 'created_at')
+    list_filter = ('kind', 'created_at')
+    readonly_fields = ('user', 'order', 'kind', 'amount', 'balance_after', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 
@@ -20,6 +52,20 @@ class CustomUserAdmin(UserAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('sku', 'name', 'stock_quantity', 'selling_price')
     search_fields = ('sku', 'name')
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        with transaction.atomic():
+            current = Product.objects.select_for_update().only('stock_quantity', 'locked_stock').get(pk=obj.pk)
+            if 'stock_quantity' not in form.changed_data:
+                obj.stock_quantity = current.stock_quantity
+            obj.locked_stock = current.locked_stock
+            super().save_model(request, obj, form, change)
+            record_stock_change(
+                obj, obj.stock_quantity - current.stock_quantity,
+                InventoryMovement.Kind.ADJUSTMENT, request.user, "admin edit",
+            )
     # inlines = [DiscountInline] removed as Discount model is deleted
 
 class OrderItemInline(admin.TabularInline):
@@ -33,6 +79,19 @@ class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'customer', 'status', 'total_amount', 'created_by', 'created_at')
     list_filter = ('status', 'created_at')
     inlines = [OrderItemInline]
-    readonly_fields = ('created_by', 'total_amount')
+    # Status only moves through workflow.transition_order (the API), which also moves
+    # stock, locked_stock, the rollups, the cash ledger and the sales facts.
+    readonly_fields = ('created_by', 'total_amount', 'status')
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ('id', 'product', 'kind', 'quantity', 'order', 'user', 'reference', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('product__sku', 'reference')
+    readonly_fields = ('product', 'kind', 'quantity', 'order', 'user', 'reference', 'created_at')
 
+    def has_add_permission(self, request):
+        return False
 
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,244 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import Customer, DailyCategorySalesFact, DailySalesFact, Order, OrderItem, User
+
+# The orders counted as sales: the same ones that make up a customer's lifetime value.
+SALES_STATES = frozenset([Order.Status.DELIVERED, Order.Status.SETTLED])
+
+MEASURES = ['order_count', 'units', 'revenue', 'discount', 'cost']
+DIMENSIONS = ['sales_rep', 'city', 'category']
+# Report interval -> fact column holding the period's first day.
+PERIODS = {'day': 'date', 'week': 'week', 'month': 'month'}
+
+FACT_CHUNK_SIZE = 2000
+# Buckets refreshed per query; keeps the OR'd conditions well inside SQLite's expression depth.
+BUCKETS_PER_QUERY = 100
+CENT = Decimal('0.01')
+
+
+def fact_key(created_at, sales_rep_id, city):
+    """The (day, sales rep, city) bucket of an order; days follow TIME_ZONE."""
+    return timezone.localdate(created_at), sales_rep_id, city or ''
+
+
+def _zero():
+    return [0, 0, Decimal('0.00'), Decimal('0.00'), Decimal('0.00')]
+
+
+def _add(measures, *values):
+    for i, value in enumerate(values):
+        measures[i] += value
+
+
+def _discount(net, percentage):
+    # total_amount is stored after the discount; undoing it gives the order's gross at the
+    # prices it was placed at, whatever the products cost today.
+    if not percentage or percentage >= 100:
+        return Decimal('0.00')
+    gross = net * 100 / (100 - percentage)
+    return (gross - net).quantize(CENT)
+
+
+def _split(amount, weights):
+    """Share `amount` out by `weights`, in cents, so the parts add up to `amount` exactly."""
+    categories = sorted(weights)
+    total = sum(weights.values())
+    parts, left = {}, amount
+    for category in categories[:-1]:
+        part = (amount * weights[category] / total).quantize(CENT) if total else Decimal('0.00')
+        parts[category] = part
+        left -= part
+    parts[categories[-1]] = left
+    return parts
+
+
+def _orders_with_lines(queryset):
+    orders = queryset.order_by('pk').values(
+        'id', 'created_at', 'created_by_id', 'customer__city', 'total_amount', 'discount_percentage',
+    )
+    last_id = 0
+    while True:
+        chunk = list(orders.filter(pk__gt=last_id)[:FACT_CHUNK_SIZE])
+        if not chunk:
+            return
+        last_id = chunk[-1]['id']
+        lines = defaultdict(list)
+        items = OrderItem.objects.filter(order__in=[order['id'] for order in chunk]).values_list(
+            'order_id', 'quantity', 'product__selling_price', 'product__cost_price', 'product__category',
+        )
+        for order_id, *line in items:
+            lines[order_id].append(line)
+        for order in chunk:
+            yield order, lines[order['id']]
+
+
+def compute_facts(queryset):
+    """
+    Sum the sales orders of `queryset` into ({(day, rep, city): measures},
+    {(day, rep, city, category): measures}), measures being MEASURES in order.
+
+    Revenue and discount come from the order's stored total and discount; an order's
+    revenue is split across categories by its lines' value at today's selling prices.
+    Cost is quantity times today's cost_price.
+    """
+    totals = defaultdict(_zero)
+    by_category = defaultdict(_zero)
+    for order, lines in _orders_with_lines(queryset.filter(status__in=SALES_STATES)):
+        key = fact_key(order['created_at'], order['created_by_id'], order['customer__city'])
+        net = order['total_amount']
+        discount = _discount(net, order['discount_percentage'])
+
+        gross, units, cost = defaultdict(Decimal), defaultdict(int), defaultdict(Decimal)
+        for quantity, price, cost_price, category in lines:
+            gross[category] += price * quantity
+            units[category] += quantity
+            cost[category] += cost_price * quantity
+        cost = {category: value.quantize(CENT) for category, value in cost.items()}
+        _add(totals[key], 1, sum(units.values()), net, discount, sum(cost.values(), Decimal('0.00')))
+
+        if lines:
+            weights = gross if any(gross.values()) else units
+            revenue_parts, discount_parts = _split(net, weights), _split(discount, weights)
+            for category in units:
+                _add(by_category[key + (category,)], 1, units[category], revenue_parts[category],
+                     discount_parts[category], cost[category])
+    return totals, by_category
+
+
+def _periods(date):
+    return {'date': date, 'week': date - datetime.timedelta(days=date.weekday()), 'month': date.replace(day=1)}
+
+
+def _fact_rows(totals, by_category):
+    facts = [
+        DailySalesFact(sales_rep_id=rep, city=city, **_periods(date), **dict(zip(MEASURES, measures)))
+        for (date, rep, city), measures in totals.items()
+    ]
+    category_facts = [
+        DailyCategorySalesFact(
+            sales_rep_id=rep, city=city, category=category, **_periods(date), **dict(zip(MEASURES, measures))
+        )
+        for (date, rep, city, category), measures in by_category.items()
+    ]
+    return facts, category_facts
+
+
+def _sale(state):
+    # Status is left out: DELIVERED -> SETTLED does not change what the order sold.
+    # lines_changed is kept, as an edit of the lines can leave every other field as it was.
+    if state is not None and state.status in SALES_STATES:
+        return state._replace(status=None)
+    return None
+
+
+def record_sales(changes):
+    """
+    Refresh the fact rows of every (day, rep, city) bucket that a list of
+    (before, after) OrderState writes added a sale to or took one from. Each bucket
+    is recomputed from its orders, so edits and deletes need no stored reversal.
+    Call inside the transaction that wrote the orders, after the write.
+    """
+    states = [
+        state
+        for before, after in changes if _sale(before) != _sale(after)
+        for state in (before, after) if state is not None and state.status in SALES_STATES
+    ]
+    if not states:
+        return
+    cities = dict(
+        Customer.objects.filter(pk__in={state.customer_id for state in states if state.customer_id})
+        .values_list('id', 'city')
+    )
+    _refresh({fact_key(state.created_at, state.created_by_id, cities.get(state.customer_id)) for state in states})
+
+
+def record_city_change(customer_id, old_city, new_city):
+    """
+    Move a customer's sales to their new city. Buckets follow the customer's current
+    city, so each sales day of theirs is recomputed under both the old and the new city.
+    Call after the customer is saved.
+    """
+    if (old_city or '') == (new_city or ''):
+        return
+    orders = Order.objects.filter(customer_id=customer_id, status__in=SALES_STATES).values_list('created_at', 'created_by_id')
+    with transaction.atomic():
+        _refresh({fact_key(created_at, rep, city) for created_at, rep in orders for city in (old_city, new_city)})
+
+
+def _refresh(keys):
+    keys = sorted(keys)
+    if not keys:
+        return
+    # Recomputes of one rep's buckets queue on the rep's row (the cash ledger locks it too),
+    # so two transactions never rebuild the same bucket from different snapshots.
+    list(User.objects.select_for_update().filter(pk__in={rep for _, rep, _ in keys}).order_by('pk').values_list('pk'))
+    for start in range(0, len(keys), BUCKETS_PER_QUERY):
+        refresh_buckets(keys[start:start + BUCKETS_PER_QUERY])
+
+
+def refresh_buckets(keys):
+    """Recompute the fact rows of the given (day, rep, city) buckets from their orders."""
+    tz = timezone.get_current_timezone()
+    orders, facts = Q(), Q()
+    for day, rep, city in keys:
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), tz)
+        in_city = Q(customer__city=city) if city else Q(customer__isnull=True) | Q(customer__city__isnull=True) | Q(customer__city='')
+        orders |= Q(created_by_id=rep, created_at__gte=start, created_at__lt=start + datetime.timedelta(days=1)) & in_city
+        facts |= Q(date=day, sales_rep_id=rep, city=city)
+
+    new_facts, new_category_facts = _fact_rows(*compute_facts(Order.objects.filter(orders)))
+    DailySalesFact.objects.filter(facts).delete()
+    DailyCategorySalesFact.objects.filter(facts).delete()
+    DailySalesFact.objects.bulk_create(new_facts)
+    DailyCategorySalesFact.objects.bulk_create(new_category_facts)
+
+
+def rebuild_sales_facts():
+    """Replace both fact tables with a full recomputation. Returns (facts, category facts) written."""
+    facts, category_facts = _fact_rows(*compute_facts(Order.objects.all()))
+    with transaction.atomic():
+        DailySalesFact.objects.all().delete()
+        DailyCategorySalesFact.objects.all().delete()
+        DailySalesFact.objects.bulk_create(facts, batch_size=FACT_CHUNK_SIZE)
+        DailyCategorySalesFact.objects.bulk_create(category_facts, batch_size=FACT_CHUNK_SIZE)
+    return len(facts), len(category_facts)
+
+
+def sales_report(date_from, date_to, interval='day', group_by=(), city=None, category=None, sales_rep=None):
+    """
+    Rows of {period, <group_by dimensions>, order_count, units, revenue, discount, cost,
+    margin} for fact days in [date_from, date_to]. Reads the category table only when
+    slicing by category, so order counts are not multiplied across categories.
+    """
+    by_category = 'category' in group_by or category is not None
+    model = DailyCategorySalesFact if by_category else DailySalesFact
+    queryset = model.objects.filter(date__gte=date_from, date__lte=date_to)
+    if city is not None:
+        queryset = queryset.filter(city=city)
+    if category is not None:
+        queryset = queryset.filter(category=category)
+    if sales_rep is not None:
+        queryset = queryset.filter(sales_rep=sales_rep)
+
+    dimensions = [dimension for dimension in DIMENSIONS if dimension in group_by]
+    rows = (
+        queryset.values(*dimensions, period=F(PERIODS[interval]))
+        .annotate(**{measure: Sum(measure) for measure in MEASURES})
+        .order_by('period', *dimensions)
+    )
+    results = list(rows)
+    usernames = {}
+    if 'sales_rep' in dimensions:
+        # Looked up afterwards rather than joined, so the GROUP BY stays on the fact table.
+        usernames = dict(User.objects.filter(pk__in={row['sales_rep'] for row in results}).values_list('id', 'username'))
+    for row in results:
+        row['margin'] = row['revenue'] - row['cost']
+        if usernames:
+            row['sales_rep_username'] = usernames.get(row['sales_rep'])
+    return results
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from .models import Event, Product, User
+
+logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY channel; the payload is empty, listeners re-read the events table.
+EVENT_CHANNEL = 'oms_events'
+
+# Products per product.stock event.
+STOCK_EVENT_BATCH_SIZE = 500
+# Rows read per fetch by a stream catching up.
+EVENT_FETCH_LIMIT = 500
+# Ids skipped by a stream (a transaction still in flight, or rolled back) are re-checked
+# for this many seconds; larger jumps than EVENT_MAX_GAP are not tracked.
+EVENT_GAP_TIMEOUT = 10
+EVENT_MAX_GAP = 1000
+
+
+def publish(events):
+    """
+    Record [(kind, owner_id, payload)] as Events in the caller's transaction. Streams
+    in this process are woken when it commits; on Postgres, pg_notify wakes the other
+    processes at commit too. Elsewhere they find the rows on their next poll.
+    """
+    if not events:
+        return
+    Event.objects.bulk_create([Event(kind=kind, owner_id=owner_id, payload=payload) for kind, owner_id, payload in events])
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, '')", [EVENT_CHANNEL])
+    transaction.on_commit(broker.notify)
+
+
+def publish_transitions(changes):
+    """Transition hook: one order.status event per order whose status changed."""
+    publish([
+        (Event.Kind.ORDER_STATUS, after.created_by_id, {
+            'order': after.order_id,
+            'status': after.status,
+            'old_status': before.status,
+            'total_amount': after.total_amount,
+        })
+        for before, after in changes
+        if before is not None and after is not None and before.status != after.status
+    ])
+
+
+def publish_stock_levels(product_ids):
+    """product.stock events with the current stock_quantity/locked_stock of `product_ids`."""
+    rows = list(
+        Product.objects.filter(pk__in=list(product_ids)).order_by('pk').values('id', 'stock_quantity', 'locked_stock')
+    )
+    publish([
+        (Event.Kind.STOCK, None, {'products': rows[start:start + STOCK_EVENT_BATCH_SIZE]})
+        for start in range(0, len(rows), STOCK_EVENT_BATCH_SIZE)
+    ])
+
+
+def publish_invoices(invoices):
+    """invoice.created events for freshly issued invoices (with their orders loaded)."""
+    publish([
+        (Event.Kind.INVOICE, invoice.order.created_by_id, {
+            'order': invoice.order_id,
+            'invoice': invoice.pk,
+            'invoice_number': invoice.invoice_number,
+        })
+        for invoice in invoices
+    ])
+
+
+def can_see(user, owner_id):
+    """Events follow order visibility: reps only see their own orders' events."""
+    return owner_id is None or owner_id == user.pk or user.role in (User.Role.ADMIN, User.Role.WAREHOUSE)
+
+
+class EventBroker:
+    """
+    In-process pub/sub. Streams subscribe an asyncio.Event that is set whenever events
+    may have been committed (by this process, or by another one as reported by the
+    Postgres listener); the stream then reads the new rows itself. Thread-safe:
+    notify() is called from request threads and the listener thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = set()
+        self._listener = None
+
+    def subscribe(self):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+            if self._listener is None and connection.vendor == 'postgresql':
+                self._listener = threading.Thread(target=self._listen, name='event-listener', daemon=True)
+                self._listener.start()
+        return waiter
+
+    def unsubscribe(self, waiter):
+        with self._lock:
+            self._waiters.discard(waiter)
+
+    def notify(self):
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The stream's loop has shut down; it unsubscribes on its way out.
+                pass
+
+    def _listen(self):
+        # A dedicated autocommit connection, so LISTEN is not tied to any request.
+        wrapper = connections['default']
+        while True:
+            try:
+                conn = wrapper.get_new_connection(wrapper.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {EVENT_CHANNEL}")
+                # Anything committed while (re)connecting is picked up by this wake-up.
+                self.notify()
+                while True:
+                    if select.select([conn], [], [], settings.EVENT_HEARTBEAT_INTERVAL) != ([], [], []):
+                        conn.poll()
+                        if conn.notifies:
+                            conn.notifies.clear()
+                            self.notify()
+            except Exception:
+                logger.exception("Event listener lost its connection; reconnecting")
+                time.sleep(settings.EVENT_POLL_INTERVAL)
+
+
+broker = EventBroker()
+
+
+def sse(event_id, kind, data):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def latest_event_id():
+    latest = await Event.objects.order_by('-id').values_list('id', flat=True).afirst()
+    return latest or 0
+
+
+async def stream_events(user, last_id):
+    """
+    Yield the SSE frames of every event after `last_id` that `user` may see, as they
+    are committed, for up to EVENT_STREAM_MAX_AGE seconds; the client then reconnects
+    with Last-Event-ID. Waits on the broker, re-reading the table every
+    EVENT_POLL_INTERVAL seconds where there is no LISTEN/NOTIFY, and sends a comment
+    every EVENT_HEARTBEAT_INTERVAL seconds of silence to keep proxies from closing it.
+    """
+    poll = settings.EVENT_POLL_INTERVAL if connection.vendor != 'postgresql' else settings.EVENT_HEARTBEAT_INTERVAL
+    started = last_sent = time.monotonic()
+    # id -> time to give up on it: ids below the cursor not seen yet, whose transaction
+    # may still commit after a later one did.
+    pending = {}
+    waiter = broker.subscribe()
+    try:
+        yield f"retry: {int(settings.EVENT_POLL_INTERVAL * 1000)}\n\n"
+        while time.monotonic() - started < settings.EVENT_STREAM_MAX_AGE:
+            waiter[1].clear()
+            now = time.monotonic()
+            pending = {event_id: until for event_id, until in pending.items() if until > now}
+            rows = Event.objects.filter(Q(id__gt=last_id) | Q(id__in=list(pending))).order_by('id')
+            fetched = 0
+            async for event_id, kind, owner_id, payload in rows.values_list('id', 'kind', 'owner_id', 'payload')[:EVENT_FETCH_LIMIT]:
+                fetched += 1
+                pending.pop(event_id, None)
+                if event_id > last_id:
+                    if event_id - last_id - 1 <= EVENT_MAX_GAP:
+                        pending.update((gap, now + EVENT_GAP_TIMEOUT) for gap in range(last_id + 1, event_id))
+                    last_id = event_id
+                if can_see(user, owner_id):
+                    # The frame carries the cursor, so a late lower id cannot rewind Last-Event-ID.
+                    yield sse(last_id, kind, payload)
+                    last_sent = time.monotonic()
+
+            if fetched == EVENT_FETCH_LIMIT:
+                # More rows are waiting; keep reading before going back to sleep.
+                continue
+            if time.monotonic() - last_sent >= settings.EVENT_HEARTBEAT_INTERVAL:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout=poll)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        broker.unsubscribe(waiter)
+
+
+def prune_events(before):
+    """Delete events created before `before`. Returns the number deleted."""
+    return Event.objects.filter(created_at__lt=before).delete()[0]
@@ -0,0 +1,191 @@
+import csv
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Invoice
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+ORDER_COLUMNS = [
+    'order_id', 'created_at', 'updated_at', 'status', 'customer_id', 'customer_name', 'customer_city',
+    'created_by', 'discount_percentage', 'total_amount', 'item_id', 'sku', 'product_name', 'quantity',
+]
+INVOICE_COLUMNS = [
+    'invoice_id', 'invoice_number', 'order_id', 'created_at', 'render_status', 'customer_name', 'sales_rep',
+    'line_count', 'subtotal', 'discount_percentage', 'discount_amount', 'total', 'currency',
+]
+CUSTOMER_COLUMNS = [
+    'id', 'name', 'phone_number', 'address', 'city', 'total_purchases', 'order_count', 'last_order_date',
+]
+
+# Lines produced per hop to the request's sync thread when streaming under ASGI.
+STREAM_BATCH_SIZE = 500
+
+
+class Echo:
+    """Write target whose write() hands the line back, so csv.writer output can be yielded."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(objects):
+    for obj in objects:
+        yield json.dumps(obj, cls=DjangoJSONEncoder) + "\n"
+
+
+def _orders(queryset):
+    # iterator(chunk_size) still runs the items prefetch, one query per chunk of orders.
+    return queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def order_csv_rows(queryset):
+    """One row per order line; orders without lines get a single row with empty item columns."""
+    for order in _orders(queryset):
+        customer = order.customer
+        head = [
+            order.pk, order.created_at.isoformat(), order.updated_at.isoformat(), order.status,
+            order.customer_id, customer.name if customer else '', customer.city if customer else '',
+            order.created_by.username, order.discount_percentage, order.total_amount,
+        ]
+        items = order.items.all()
+        if not items:
+            yield head + ['', '', '', '']
+        for item in items:
+            yield head + [item.pk, item.product.sku, item.product.name, item.quantity]
+
+
+def order_objects(queryset):
+    for order in _orders(queryset):
+        customer = order.customer
+        yield {
+            'id': order.pk,
+            'created_at': order.created_at,
+            'updated_at': order.updated_at,
+            'status': order.status,
+            'customer': {'id': customer.pk, 'name': customer.name, 'city': customer.city} if customer else None,
+            'created_by': order.created_by.username,
+            'discount_percentage': order.discount_percentage,
+            'total_amount': order.total_amount,
+            'items': [
+                {'id': item.pk, 'sku': item.product.sku, 'name': item.product.name, 'quantity': item.quantity}
+                for item in order.items.all()
+            ],
+        }
+
+
+def _invoices(order_queryset):
+    return (
+        Invoice.objects.filter(order__in=order_queryset.values('pk'))
+        .order_by('id')
+        .only('id', 'invoice_number', 'order_id', 'created_at', 'render_status', 'invoice_data')
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+
+
+def invoice_csv_rows(order_queryset):
+    for invoice in _invoices(order_queryset):
+        data = invoice.invoice_data
+        yield [
+            invoice.pk, invoice.invoice_number, invoice.order_id, invoice.created_at.isoformat(),
+            invoice.render_status, data.get('customer_name'), data.get('sales_rep'), len(data.get('items', [])),
+            data.get('subtotal'), data.get('discount_percentage'), data.get('discount_amount'),
+            data.get('total'), data.get('currency'),
+        ]
+
+
+def invoice_objects(order_queryset):
+    for invoice in _invoices(order_queryset):
+        yield {
+            'id': invoice.pk,
+            'invoice_number': invoice.invoice_number,
+            'order_id': invoice.order_id,
+            'created_at': invoice.created_at,
+            'render_status': invoice.render_status,
+            'invoice_data': invoice.invoice_data,
+        }
+
+
+def _customers(queryset):
+    return queryset.order_by('id').values_list(*CUSTOMER_COLUMNS).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def customer_csv_rows(queryset):
+    for row in _customers(queryset):
+        yield [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+
+
+def customer_objects(queryset):
+    for row in _customers(queryset):
+        yield dict(zip(CUSTOMER_COLUMNS, row))
+
+
+def requested_format(request):
+    # `format` is DRF's renderer override, so exports take ?fmt=csv|ndjson.
+    return request.query_params.get('fmt', 'csv').lower()
+
+
+EXPORTS = {
+    'orders': (ORDER_COLUMNS, order_csv_rows, order_objects),
+    'invoices': (INVOICE_COLUMNS, invoice_csv_rows, invoice_objects),
+    'customers': (CUSTOMER_COLUMNS, customer_csv_rows, customer_objects),
+}
+
+
+async def _pull(lines, batch_size):
+    # Async iterator over the sync `lines`, advanced batch_size lines at a time by
+    # sync_to_async, i.e. in the thread (and on the database connection) the view ran in.
+    lines = iter(lines)
+    next_batch = sync_to_async(lambda: list(itertools.islice(lines, batch_size)))
+    try:
+        while batch := await next_batch():
+            for line in batch:
+                yield line
+    finally:
+        if hasattr(lines, 'close'):
+            await sync_to_async(lines.close)()
+
+
+def streaming_response(request, lines, content_type, batch_size=STREAM_BATCH_SIZE):
+    """
+    StreamingHttpResponse sending the sync iterator `lines`. Under ASGI Django reads a
+    sync iterator to the end before sending anything, so there the lines are handed
+    over through an async iterator instead. Use batch_size=1 for progress output that
+    should reach the client line by line.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        lines = _pull(lines, batch_size)
+    return StreamingHttpResponse(lines, content_type=content_type)
+
+
+def export_response(request, name, queryset, fmt):
+    """
+    StreamingHttpResponse exporting `queryset` as CSV or NDJSON. `name` is a key of
+    EXPORTS; for 'invoices' the queryset is the (filtered) orders whose invoices to export.
+    Rows are produced while the response is sent, so memory stays flat however many match.
+    """
+    columns, csv_rows, objects = EXPORTS[name]
+    if fmt == 'csv':
+        lines = _csv_lines(columns, csv_rows(queryset))
+    else:
+        lines = _ndjson_lines(objects(queryset))
+    response = streaming_response(request, lines, EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
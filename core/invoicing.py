@@ -0,0 +1,160 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F, Max, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .events import publish_invoices
+from .models import Invoice, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+INVOICE_CURRENCY = 'EGP'
+
+
+def invoice_snapshots(orders):
+    """
+    invoice_data for each of `orders` ({order_id: data}). Orders should come with
+    customer and created_by joined; all their lines are read in a single query.
+    """
+    lines = defaultdict(list)
+    rows = (
+        OrderItem.objects.filter(order__in=[order.pk for order in orders])
+        .order_by('order_id', 'id')
+        .values_list('order_id', 'quantity', 'product__sku', 'product__category', 'product__selling_price')
+    )
+    for order_id, quantity, sku, category, price in rows:
+        lines[order_id].append((quantity, sku, category, price))
+
+    issued_at = timezone.now().isoformat()
+    snapshots = {}
+    for order in orders:
+        subtotal = sum((price * quantity for quantity, _, _, price in lines[order.pk]), 0)
+        discount_amount = subtotal * (order.discount_percentage / 100)
+        total = subtotal - discount_amount
+        customer = order.customer
+        snapshots[order.pk] = {
+            'order_id': order.id,
+            'customer_name': customer.name if customer else "Guest",
+            'customer_phone': customer.phone_number if customer else "",
+            'customer_address': customer.address if customer else "",
+            'sales_rep': order.created_by.get_full_name() or order.created_by.username,
+            'issued_at': issued_at,
+            'items': [
+                {
+                    'sku': sku,
+                    'category': category,
+                    'quantity': quantity,
+                    'unit_price': str(price),
+                    'total': str(price * quantity)
+                }
+                for quantity, sku, category, price in lines[order.pk]
+            ],
+            'subtotal': str(subtotal),
+            'discount_percentage': str(order.discount_percentage),
+            'discount_amount': str(discount_amount),
+            'total': str(total),
+            'currency': INVOICE_CURRENCY
+        }
+    return snapshots
+
+
+def is_invoice_current(order, last_invoice):
+    """An order's latest invoice stays valid until the order is edited again."""
+    return last_invoice is not None and order.updated_at <= last_invoice.created_at
+
+
+def issue_invoice(order):
+    """
+    Return (invoice, created). Reuses the latest invoice if the order has not changed
+    since; otherwise snapshots the order, numbers the invoice from the order's
+    sequence and queues it for rendering.
+    """
+    return issue_invoices([order])[0][1:]
+
+
+def issue_invoices(orders):
+    """
+    Batch form of issue_invoice: returns [(order, invoice, created), ...] in the order
+    given, using a fixed number of queries however many orders are passed.
+    """
+    order_ids = [order.pk for order in orders]
+    latest_ids = (
+        Invoice.objects.filter(order__in=order_ids)
+        .order_by()
+        .values('order_id')
+        .annotate(last_id=Max('id'))
+        .values_list('last_id', flat=True)
+    )
+    latest = {invoice.order_id: invoice for invoice in Invoice.objects.filter(pk__in=list(latest_ids))}
+
+    stale = [order for order in orders if not is_invoice_current(order, latest.get(order.pk))]
+    new_invoices = {}
+    if stale:
+        snapshots = invoice_snapshots(stale)
+        stale_ids = [order.pk for order in stale]
+        with transaction.atomic():
+            # The UPDATE row-locks the orders, so concurrent requests get distinct numbers.
+            Order.objects.filter(pk__in=stale_ids).update(invoice_sequence=F('invoice_sequence') + 1)
+            sequences = dict(Order.objects.filter(pk__in=stale_ids).values_list('id', 'invoice_sequence'))
+            created = Invoice.objects.bulk_create([
+                Invoice(
+                    order=order,
+                    invoice_number=f"INV-{order.id}-{sequences[order.pk]:02d}",
+                    invoice_data=snapshots[order.pk],
+                )
+                for order in stale
+            ])
+            publish_invoices(created)
+        new_invoices = {invoice.order_id: invoice for invoice in created}
+
+    return [
+        (order, new_invoices[order.pk], True) if order.pk in new_invoices else (order, latest[order.pk], False)
+        for order in orders
+    ]
+
+
+def claim_render_jobs(limit):
+    """
+    Mark up to `limit` queued invoices as RENDERING and return them. Jobs whose worker
+    died mid-render are picked up again once their claim is older than the lease.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.INVOICE_RENDER_LEASE)
+    with transaction.atomic():
+        queue = Invoice.objects.filter(
+            Q(render_status=Invoice.RenderStatus.PENDING)
+            | Q(render_status=Invoice.RenderStatus.RENDERING, render_claimed_at__lt=stale)
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            queue = queue.select_for_update(skip_locked=True)
+        ids = list(queue.values_list('id', flat=True)[:limit])
+        Invoice.objects.filter(pk__in=ids).update(
+            render_status=Invoice.RenderStatus.RENDERING,
+            render_claimed_at=timezone.now(),
+            render_attempts=F('render_attempts') + 1,
+        )
+    return list(Invoice.objects.filter(pk__in=ids).order_by('id'))
+
+
+def render_invoice(invoice):
+    """Render `invoice` to HTML under MEDIA_ROOT/invoices/ and mark it DONE (or FAILED/requeued)."""
+    try:
+        if not invoice.document:
+            html = render_to_string('core/invoice.html', {'invoice': invoice, 'data': invoice.invoice_data})
+            invoice.document.save(f"{invoice.invoice_number}.html", ContentFile(html.encode()), save=False)
+        invoice.render_status = Invoice.RenderStatus.DONE
+        invoice.render_error = ''
+    except Exception as exc:
+        logger.exception("Rendering invoice %s failed", invoice.invoice_number)
+        invoice.render_error = str(exc)
+        if invoice.render_attempts >= settings.INVOICE_RENDER_MAX_ATTEMPTS:
+            invoice.render_status = Invoice.RenderStatus.FAILED
+        else:
+            invoice.render_status = Invoice.RenderStatus.PENDING
+    invoice.save(update_fields=['document', 'render_status', 'render_error'])
+    return invoice
@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+from django.db.models import F
+
+from .models import CashLedgerEntry, Order, User
+
+
+def cash_postings(before, after):
+    """
+    The (user_id, order_id, kind, amount) ledger postings for one order write.
+    `before`/`after` are core.rollups.OrderState tuples (None on create/delete). Reps
+    hold the cash of their DELIVERED orders until the order is SETTLED.
+    """
+    held_before = before if before is not None and before.status == Order.Status.DELIVERED else None
+    held_after = after if after is not None and after.status == Order.Status.DELIVERED else None
+    if held_before is None and held_after is None:
+        return []
+
+    if held_before and held_after and held_before.created_by_id == held_after.created_by_id:
+        change = held_after.total_amount - held_before.total_amount
+        if change:
+            return [(held_after.created_by_id, held_after.order_id, CashLedgerEntry.Kind.ADJUSTMENT, change)]
+        return []
+
+    postings = []
+    if held_before:
+        settled = after is not None and after.status == Order.Status.SETTLED
+        kind = CashLedgerEntry.Kind.SETTLEMENT if settled else CashLedgerEntry.Kind.ADJUSTMENT
+        # A deleted order is already gone by the time its reversal is posted.
+        order_id = held_before.order_id if after is not None else None
+        postings.append((held_before.created_by_id, order_id, kind, -held_before.total_amount))
+    if held_after:
+        postings.append((held_after.created_by_id, held_after.order_id, CashLedgerEntry.Kind.COLLECTION, held_after.total_amount))
+    return postings
+
+
+def record_cash_movements(changes):
+    """
+    Post the cash ledger entries for a list of (before, after) order writes: one
+    balance UPDATE per rep and one INSERT for all entries, however many orders moved.
+    """
+    by_user = defaultdict(list)
+    for before, after in changes:
+        for posting in cash_postings(before, after):
+            by_user[posting[0]].append(posting)
+
+    entries = []
+    # Reps in id order, so concurrent batches lock their rows in the same order.
+    for user_id in sorted(by_user):
+        postings = by_user[user_id]
+        total = sum(amount for _, _, _, amount in postings)
+        # The UPDATE row-locks the rep, so balance_after is exact under concurrent postings.
+        User.objects.filter(pk=user_id).update(cash_on_hand=F('cash_on_hand') + total)
+        balance = User.objects.filter(pk=user_id).values_list('cash_on_hand', flat=True).get() - total
+        for _, order_id, kind, amount in postings:
+            balance += amount
+            entries.append(CashLedgerEntry(user_id=user_id, order_id=order_id, kind=kind, amount=amount, balance_after=balance))
+    if entries:
+        CashLedgerEntry.objects.bulk_create(entries)
@@ -0,0 +1,167 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import LOW_STOCK_THRESHOLD, Customer, Order, OrderItem, Product
+from core.stock import LOCKED_STATES, expected_locked_stock
+
+User = get_user_model()
+
+# Roughly what a mature tenant looks like: most orders long settled, a thin slice open.
+STATUS_WEIGHTS = {
+    Order.Status.SETTLED: 80,
+    Order.Status.DELIVERED: 5,
+    Order.Status.REJECTED: 5,
+    Order.Status.DRAFT: 4,
+    Order.Status.PACKED: 2,
+    Order.Status.OUT_FOR_DELIVERY: 2,
+    Order.Status.PENDING_APPROVAL: 1,
+    Order.Status.APPROVED: 1,
+}
+BATCH_SIZE = 5000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Load synthetic orders, then time each hot query with and without its index and print '
+        'both EXPLAIN plans. Everything, including the dropped indexes, is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200000, help='Synthetic orders to load (e.g. 1000000)')
+        parser.add_argument('--reps', type=int, default=50)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query; the median is reported')
+        parser.add_argument('--seed', type=int, default=21)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        reps, products = self.load(rng, options)
+        self.stdout.write(f"Loaded {options['orders']} orders in {time.perf_counter() - started:.1f}s\n")
+
+        rep = reps[0]
+        now = timezone.now()
+        month = (now - datetime.timedelta(days=60), now - datetime.timedelta(days=30))
+        hot = products[0]
+        cases = [
+            ('order_created_idx', "Order list, newest first",
+             lambda: Order.objects.order_by('-created_at').values_list('id', flat=True)[:50]),
+            ('order_creator_created_idx', "A rep's order list, newest first",
+             lambda: Order.objects.filter(created_by=rep).order_by('-created_at').values_list('id', flat=True)[:50]),
+            ('order_creator_status_idx', "A rep's PENDING_APPROVAL orders",
+             lambda: Order.objects.filter(created_by=rep, status=Order.Status.PENDING_APPROVAL).values_list('id', flat=True)),
+            ('order_status_created_idx', "DELIVERED orders in a 30-day window",
+             lambda: Order.objects.filter(status=Order.Status.DELIVERED, created_at__range=month).values_list('id', flat=True)),
+            ('order_open_idx', "Approval queue (PENDING_APPROVAL/APPROVED), newest first",
+             lambda: Order.objects.filter(status__in=LOCKED_STATES).order_by('-created_at').values_list('id', flat=True)[:50]),
+            ('orderitem_product_order_idx', "Expected locked_stock of a hot product",
+             lambda: Product.objects.filter(pk=hot.pk).annotate(expected=expected_locked_stock()).values_list('expected', flat=True)),
+            ('product_low_stock_idx', "Low-stock products",
+             lambda: Product.objects.filter(stock_quantity__lt=LOW_STOCK_THRESHOLD).values_list('id', flat=True)),
+        ]
+
+        for index_name, label, make_query in cases:
+            with_index = self.measure(make_query, options['repeat'])
+            try:
+                with transaction.atomic():
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"DROP INDEX {connection.ops.quote_name(index_name)}")
+                    self.analyze()
+                    without_index = self.measure(make_query, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+            speedup = without_index[0] / with_index[0] if with_index[0] else float('inf')
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{index_name}: {label}"))
+            self.stdout.write(f"  without: {without_index[0]:8.2f}ms  {self.plan_summary(without_index[1])}")
+            self.stdout.write(f"  with:    {with_index[0]:8.2f}ms  {self.plan_summary(with_index[1])}")
+            self.stdout.write(f"  {speedup:.1f}x faster")
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  plan without:\n{without_index[1]}\n  plan with:\n{with_index[1]}")
+
+    def load(self, rng, options):
+        reps = User.objects.bulk_create([
+            User(username=f'bench_rep_{i}', role=User.Role.SALES_REP) for i in range(options['reps'])
+        ])
+        customers = Customer.objects.bulk_create([
+            Customer(name=f'Bench Customer {i}', city=Customer.City.CAIRO) for i in range(1000)
+        ])
+        products = Product.objects.bulk_create([
+            Product(sku=f'BENCH-{i:06d}', name=f'Bench Part {i}', stock_quantity=rng.randint(0, 500),
+                    cost_price=5, selling_price=10)
+            for i in range(options['products'])
+        ])
+
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        now = timezone.now()
+        created_at = Order._meta.get_field('created_at')
+        # bulk_create would stamp every row with now(); spread orders over two years instead.
+        created_at.auto_now_add = False
+        try:
+            for start in range(0, options['orders'], BATCH_SIZE):
+                count = min(BATCH_SIZE, options['orders'] - start)
+                orders = Order.objects.bulk_create([
+                    Order(
+                        status=rng.choices(statuses, weights)[0],
+                        customer=rng.choice(customers),
+                        created_by=rng.choice(reps),
+                        total_amount=10,
+                        created_at=now - datetime.timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60)),
+                    )
+                    for _ in range(count)
+                ])
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=rng.choice(products[:50]) if rng.random() < 0.3 else rng.choice(products),
+                              quantity=rng.randint(1, 5))
+                    for order in orders
+                ])
+        finally:
+            created_at.auto_now_add = True
+        self.analyze()
+        return reps, products
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("ANALYZE core_order, core_orderitem, core_product")
+            else:
+                cursor.execute("ANALYZE")
+
+    def measure(self, make_query, repeat):
+        """(median ms over `repeat` runs, EXPLAIN output) for the queryset `make_query` builds."""
+        plan = make_query().explain()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(make_query())
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), plan
+
+    def plan_summary(self, plan):
+        lines = [line.strip() for line in plan.splitlines() if line.strip()]
+        if connection.vendor == 'postgresql':
+            # The top node carries the access path and the cost estimate.
+            return lines[0]
+        # SQLite lists one step per line; the table accesses are the SCAN/SEARCH steps.
+        return ' | '.join(line.split(' ', 3)[-1] for line in lines if 'SCAN' in line or 'SEARCH' in line or 'TEMP' in line)
@@ -0,0 +1,108 @@
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Product
+from core.profitability import GROUPINGS, ReportUnavailable, compute_margins, profitability_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the vectorized margin computation on synthetic order lines (no database access) '
+        'against the same sums done line by line with Decimals. With --database, time the '
+        'profitability report end to end on the configured database instead.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=5000000)
+        parser.add_argument('--orders', type=int, default=1500000)
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--reps', type=int, default=50)
+        parser.add_argument('--python-lines', type=int, default=200000,
+                            help='Lines summed with the Decimal loop; its time is scaled up to --lines')
+        parser.add_argument('--seed', type=int, default=23)
+        parser.add_argument('--database', action='store_true', help='Run the report on the real tables')
+
+    def handle(self, *args, **options):
+        try:
+            if options['database']:
+                self.run_report()
+            else:
+                self.run_synthetic(options)
+        except ReportUnavailable as exc:
+            raise CommandError(str(exc))
+
+    def run_report(self):
+        for grouping in GROUPINGS:
+            totals, _, timings = profitability_report(group_by=grouping)
+            self.stdout.write(
+                f"{grouping:>9}: {totals['lines']} lines, load {timings['load']:.0f}ms, "
+                f"compute {timings['compute']:.0f}ms, margin {totals['margin']}"
+            )
+
+    def run_synthetic(self, options):
+        import numpy as np
+
+        rng = np.random.default_rng(options['seed'])
+        n_lines, n_orders, n_products = options['lines'], options['orders'], options['products']
+        lines = np.column_stack([
+            np.sort(rng.integers(1, n_orders + 1, n_lines)),
+            rng.integers(1, n_products + 1, n_lines),
+            rng.integers(1, 10, n_lines),
+        ])
+        price = rng.integers(500, 50000, n_products) / 100
+        # Stored totals: the lines at list price less a discount.
+        listed = np.bincount(lines[:, 0], weights=lines[:, 2] * price[lines[:, 1] - 1], minlength=n_orders + 1)[1:]
+        discount = rng.choice([0, 0, 0, 5, 10, 12.5], n_orders)
+        orders = np.column_stack([
+            np.arange(1, n_orders + 1),
+            rng.integers(1, options['reps'] + 1, n_orders),
+            np.round(listed * (100 - discount) / 100, 2),
+        ]).astype(np.float64)
+        products = np.column_stack([
+            np.arange(1, n_products + 1),
+            price,
+            np.round(price * rng.uniform(0.5, 0.9, n_products), 2),
+            rng.integers(0, len(Product.Category.values), n_products),
+        ]).astype(np.float64)
+
+        started = time.perf_counter()
+        totals = compute_margins(lines, orders, products)
+        vectorized = time.perf_counter() - started
+        _, _, revenue, cost = totals['product']
+        self.stdout.write(
+            f"Vectorized: {n_lines} lines in {vectorized * 1000:.0f}ms "
+            f"(revenue {revenue.sum():,.2f}, margin {revenue.sum() - cost.sum():,.2f})"
+        )
+
+        sample = min(options['python_lines'], n_lines)
+        totals = {int(oid): (int(rep), Decimal(str(total))) for oid, rep, total in orders.tolist()}
+        prices = {int(pid): (Decimal(str(p)), Decimal(str(c)), int(cat)) for pid, p, c, cat in products.tolist()}
+        sample_lines = lines[:sample].tolist()
+        started = time.perf_counter()
+        self.decimal_loop(sample_lines, totals, prices)
+        looped = (time.perf_counter() - started) * n_lines / sample if sample else 0
+        self.stdout.write(
+            f"Decimal loop: {sample} lines, {looped:.1f}s scaled to {n_lines} lines "
+            f"({looped / vectorized:.0f}x slower)"
+        )
+
+    def decimal_loop(self, lines, totals, prices):
+        """The per-line Decimal arithmetic the vectorized path replaces."""
+        order_values = defaultdict(Decimal)
+        for order_id, product_id, quantity in lines:
+            order_values[order_id] += prices[product_id][0] * quantity
+        sums = {grouping: defaultdict(lambda: [0, Decimal('0'), Decimal('0')]) for grouping in GROUPINGS}
+        for order_id, product_id, quantity in lines:
+            rep, total = totals[order_id]
+            price, cost_price, category = prices[product_id]
+            revenue = total * price * quantity / order_values[order_id]
+            cost = cost_price * quantity
+            for grouping, key in zip(GROUPINGS, (order_id, product_id, category, rep)):
+                row = sums[grouping][key]
+                row[0] += quantity
+                row[1] += revenue
+                row[2] += cost
+        return sums
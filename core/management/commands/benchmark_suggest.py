@@ -0,0 +1,75 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from core.suggest import SuggestIndex
+
+PREFIXES = ['BRK', 'FLT', 'CLT', 'ENG', 'SUS', 'ELC', 'TRN', 'EXH', 'COL', 'STR']
+WORDS = [
+    'brake', 'pad', 'disc', 'filter', 'oil', 'air', 'fuel', 'clutch', 'plate', 'bearing',
+    'shock', 'absorber', 'spark', 'plug', 'belt', 'timing', 'gasket', 'pump', 'water', 'sensor',
+    'front', 'rear', 'left', 'right', 'kit', 'assembly', 'hose', 'radiator', 'mirror', 'lamp',
+]
+
+
+def typo(text, rng):
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the in-process product suggest index on synthetic SKUs (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = [
+            (
+                i,
+                f"{rng.choice(PREFIXES)}-{i:06d}",
+                ' '.join(rng.sample(WORDS, 3)).title(),
+                'SPARE_PART',
+            )
+            for i in range(1, options['products'] + 1)
+        ]
+
+        index = SuggestIndex()
+        tracemalloc.start()
+        started = time.perf_counter()
+        index.build(rows)
+        build_seconds = time.perf_counter() - started
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(
+            f"Built {len(index)} products in {build_seconds:.2f}s, {memory / 1024 / 1024:.1f} MiB"
+        )
+
+        samples = [rng.choice(rows) for _ in range(options['queries'])]
+        workloads = {
+            'sku prefix': [sku[:rng.randint(3, 8)] for _, sku, _, _ in samples],
+            'sku typo': [typo(sku[:8], rng) for _, sku, _, _ in samples],
+            'name words': [' '.join(word[:4] for word in name.split()[:2]) for _, _, name, _ in samples],
+        }
+        for label, queries in workloads.items():
+            timings, hits = [], 0
+            for query in queries:
+                started = time.perf_counter()
+                results = index.suggest(query, 10)
+                timings.append((time.perf_counter() - started) * 1000)
+                hits += bool(results)
+            timings.sort()
+            self.stdout.write(
+                f"{label:>10}: p50={statistics.median(timings):.3f}ms "
+                f"p99={timings[int(len(timings) * 0.99) - 1]:.3f}ms hit-rate={hits / len(queries):.0%}"
+            )
+
+        started = time.perf_counter()
+        for product_id, sku, name, category in samples[:1000]:
+            index.upsert(product_id, sku, f"{name} Updated", category)
+        self.stdout.write(f"1000 incremental updates in {(time.perf_counter() - started) * 1000:.1f}ms")
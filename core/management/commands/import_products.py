@@ -0,0 +1,35 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from core.product_import import ImportFileError, ProductImport, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Upsert products by SKU from a supplier CSV/XLSX price list'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to a .csv or .xlsx file with a header row')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+
+        with open(path, 'rb') as fileobj:
+            try:
+                report = ProductImport(dry_run=options['dry_run']).run(read_rows(fileobj, path))
+            except ImportFileError as exc:
+                raise CommandError(str(exc))
+
+        for change in report['changes']:
+            fields = ', '.join(f"{field}: {old} -> {new}" for field, (old, new) in change['fields'].items())
+            self.stdout.write(f"row {change['row']} {change['action']} {change['sku']}: {fields}")
+        for error in report['errors']:
+            self.stdout.write(self.style.ERROR(f"row {error['row']} {error['sku'] or '-'}: {'; '.join(error['errors'])}"))
+
+        verb = 'Would import' if report['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {report['rows']} row(s): {report['created']} created, {report['updated']} updated, "
+            f"{report['unchanged']} unchanged, {len(report['errors'])} rejected"
+        ))
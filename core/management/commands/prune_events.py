@@ -0,0 +1,18 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.events import prune_events
+
+
+class Command(BaseCommand):
+    help = 'Delete pushed events older than EVENT_RETENTION_DAYS (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.EVENT_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        deleted = prune_events(timezone.now() - datetime.timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} events older than {options['days']} days"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core.rollups import rebuild_status_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user order status rollups behind the dashboard'
+
+    def handle(self, *args, **options):
+        rows = rebuild_status_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup row(s)"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from core.models import Product
+from core.response_cache import bump_cache_version
+from core.stock import expected_locked_stock
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or with --check, verify) the materialized Product.locked_stock counter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report products whose counter has drifted')
+
+    def handle(self, *args, **options):
+        drifted = (
+            Product.objects.annotate(expected=expected_locked_stock())
+            .exclude(locked_stock=F('expected'))
+            .order_by('sku')
+        )
+
+        if options['check']:
+            rows = list(drifted.values_list('sku', 'locked_stock', 'expected'))
+            for sku, locked, expected in rows:
+                self.stdout.write(f"{sku}: locked_stock={locked}, expected={expected}")
+            if rows:
+                raise CommandError(f"{len(rows)} product(s) have a drifted locked_stock")
+            self.stdout.write(self.style.SUCCESS("locked_stock is consistent"))
+            return
+
+        with transaction.atomic():
+            # Only touch drifted rows so their updated_at (used by sync clients) stays meaningful.
+            updated = Product.objects.filter(pk__in=list(drifted.values_list('pk', flat=True))).update(
+                locked_stock=expected_locked_stock(),
+                updated_at=Now(),
+            )
+            bump_cache_version(Product)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt locked_stock for {updated} product(s)"))
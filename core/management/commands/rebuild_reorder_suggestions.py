@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.models import ReorderSuggestion
+from core.replenishment import ForecastUnavailable, history_window, rebuild_reorder_suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the reorder suggestions from the order history (run nightly); '
+        'the dashboard and /api/products/reorder-suggestions/ read the result'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=0, help='Print the N products with the fewest days of cover')
+
+    def handle(self, *args, **options):
+        first_day, last_day = history_window()
+        started = time.perf_counter()
+        try:
+            products, to_reorder = rebuild_reorder_suggestions()
+        except ForecastUnavailable as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Forecast {products} products from orders of {first_day}..{last_day} in "
+            f"{time.perf_counter() - started:.1f}s; {to_reorder} need reordering"
+        ))
+
+        urgent = (
+            ReorderSuggestion.objects.filter(needs_reorder=True)
+            .select_related('product')
+            .order_by('days_of_cover', 'product')[:options['top']]
+        )
+        for suggestion in urgent:
+            self.stdout.write(
+                f"  {suggestion.product.sku}: {suggestion.available} left, {suggestion.daily_velocity}/day, "
+                f"{suggestion.days_of_cover} days of cover, reorder {suggestion.suggested_quantity}"
+            )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.analytics import MEASURES, compute_facts, rebuild_sales_facts
+from core.models import DailyCategorySalesFact, DailySalesFact, Order
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or with --check, verify) the daily sales fact tables from the orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report fact rows that differ from the orders')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            facts, category_facts = rebuild_sales_facts()
+            self.stdout.write(self.style.SUCCESS(f"Wrote {facts} daily and {category_facts} daily category fact rows"))
+            return
+
+        totals, by_category = compute_facts(Order.objects.all())
+        drifted = self.compare(DailySalesFact.objects.values_list('date', 'sales_rep', 'city', *MEASURES), totals, 3)
+        drifted += self.compare(
+            DailyCategorySalesFact.objects.values_list('date', 'sales_rep', 'city', 'category', *MEASURES), by_category, 4
+        )
+        if drifted:
+            raise CommandError(f"{drifted} fact row(s) differ from the orders")
+        self.stdout.write(self.style.SUCCESS("Sales facts are consistent"))
+
+    def compare(self, rows, expected, key_length):
+        stored = {row[:key_length]: list(row[key_length:]) for row in rows}
+        drifted = 0
+        for key in sorted(set(stored) | set(expected), key=str):
+            if stored.get(key) != expected.get(key):
+                drifted += 1
+                self.stdout.write(f"{key}: stored={stored.get(key)}, expected={expected.get(key)}")
+        return drifted
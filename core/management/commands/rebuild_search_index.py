@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from core.response_cache import bump_cache_version
+from core.models import Product
+from core.search import drop_search_index, has_search_index, install_search_index
+
+
+class Command(BaseCommand):
+    help = 'Drop and recreate the product full-text search index (FTS5 on SQLite, tsvector/trigram on Postgres)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--check', action='store_true', help='Only report whether the index is in place')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        connection = connections[alias]
+
+        if options['check']:
+            if not has_search_index(alias):
+                raise CommandError(f"No product search index on {connection.vendor}; search uses icontains lookups")
+            self.stdout.write(self.style.SUCCESS("Product search index is in place"))
+            return
+
+        with transaction.atomic(using=alias):
+            drop_search_index(connection)
+            if not install_search_index(connection):
+                raise CommandError(f"Full-text search is not supported on {connection.vendor}")
+            bump_cache_version(Product)
+        count = Product.objects.using(alias).count()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt product search index ({count} product(s))"))
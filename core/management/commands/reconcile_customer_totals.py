@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q
+from core.models import Customer
+from core.response_cache import bump_cache_version
+from core.rollups import customer_totals_expressions
+
+
+class Command(BaseCommand):
+    help = 'Recompute (or with --check, verify) the customer lifetime-value columns from orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report customers whose totals have drifted')
+
+    def handle(self, *args, **options):
+        expected = customer_totals_expressions()
+        drifted = (
+            Customer.objects.annotate(**{f"expected_{name}": expr for name, expr in expected.items()})
+            .exclude(
+                Q(total_purchases=F('expected_total_purchases'))
+                & Q(order_count=F('expected_order_count'))
+                & (Q(last_order_date=F('expected_last_order_date'))
+                   | Q(last_order_date__isnull=True, expected_last_order_date__isnull=True))
+            )
+            .order_by('pk')
+        )
+
+        if options['check']:
+            rows = list(drifted.values_list('pk', 'name', 'total_purchases', 'expected_total_purchases', 'order_count', 'expected_order_count'))
+            for pk, name, total, expected_total, count, expected_count in rows:
+                self.stdout.write(f"#{pk} {name}: total={total} (expected {expected_total}), orders={count} (expected {expected_count})")
+            if rows:
+                raise CommandError(f"{len(rows)} customer(s) have drifted totals")
+            self.stdout.write(self.style.SUCCESS("Customer totals are consistent"))
+            return
+
+        with transaction.atomic():
+            updated = Customer.objects.filter(pk__in=list(drifted.values_list('pk', flat=True))).update(**expected)
+            if updated:
+                bump_cache_version(Customer)
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {updated} customer(s)"))
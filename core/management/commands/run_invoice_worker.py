@@ -0,0 +1,37 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from core.invoicing import claim_render_jobs, render_invoice
+
+
+def _render(invoice):
+    try:
+        return render_invoice(invoice)
+    finally:
+        # Each pool thread holds its own DB connection.
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Render queued invoices to disk using a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of rendering threads')
+        parser.add_argument('--batch-size', type=int, default=50, help='Invoices claimed per poll')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                close_old_connections()
+                jobs = claim_render_jobs(options['batch_size'])
+                if jobs:
+                    for invoice in pool.map(_render, jobs):
+                        self.stdout.write(f"{invoice.invoice_number}: {invoice.render_status}")
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Max
+from core.models import InventoryMovement, Product, StockSnapshot
+from core.stock import with_ledger_stock
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold recent inventory movements into new StockSnapshot rows so ledger stock stays cheap '
+        'to compute (run nightly); with --check, compare the ledger against Product.stock_quantity'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report products whose stock_quantity disagrees with the ledger')
+
+    def handle(self, *args, **options):
+        upto = InventoryMovement.objects.aggregate(last=Max('id'))['last'] or 0
+        products = with_ledger_stock(Product.objects.order_by('sku'), upto=upto)
+
+        if options['check']:
+            drifted = list(
+                products.exclude(stock_quantity=F('ledger_quantity')).values_list('sku', 'stock_quantity', 'ledger_quantity')
+            )
+            for sku, stock, ledger in drifted:
+                self.stdout.write(f"{sku}: stock_quantity={stock}, ledger={ledger}")
+            if drifted:
+                raise CommandError(f"{len(drifted)} product(s) disagree with the inventory ledger")
+            self.stdout.write(self.style.SUCCESS("stock_quantity matches the inventory ledger"))
+            return
+
+        # Only products that moved since their last snapshot need a new one.
+        moved = (
+            products.filter(movements__id__gt=F('snapshot_movement_id'), movements__id__lte=upto)
+            .distinct()
+            .values_list('id', 'ledger_quantity')
+        )
+        with transaction.atomic():
+            created = StockSnapshot.objects.bulk_create(
+                [StockSnapshot(product_id=pid, quantity=quantity, movement_id=upto) for pid, quantity in moved],
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {len(created)} product(s) up to movement #{upto}"))
@@ -0,0 +1,138 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Sum
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.models import CashLedgerEntry, Customer, InventoryMovement, Order, OrderItem, Product, StockSnapshot
+from core.stock import HOLDING_STATES, LOCKED_STATES, expected_locked_stock, with_ledger_stock
+from core.views import OrderViewSet
+
+User = get_user_model()
+
+PREFIX = 'STRESS-'
+
+
+class Command(BaseCommand):
+    help = 'Approve orders sharing hot SKUs from many threads at once and verify no stock is oversold or lost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=300, help='Orders competing for the hot SKUs')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--stock', type=int, default=200, help='Starting stock of each hot SKU')
+        parser.add_argument('--min-rate', type=float, default=50.0, help='Fail below this many transitions per second')
+        parser.add_argument('--keep', action='store_true', help='Leave the STRESS- data in place afterwards')
+
+    def handle(self, *args, **options):
+        self.cleanup()
+        try:
+            self.run(options)
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+    def cleanup(self):
+        orders = Order.objects.filter(created_by__username='stress_admin')
+        CashLedgerEntry.objects.filter(user__username='stress_admin').delete()
+        orders.delete()
+        products = Product.objects.filter(sku__startswith=PREFIX)
+        InventoryMovement.objects.filter(product__in=products).delete()
+        StockSnapshot.objects.filter(product__in=products).delete()
+        products.delete()
+        Customer.objects.filter(name='Stress Customer').delete()
+        User.objects.filter(username='stress_admin').delete()
+
+    def run(self, options):
+        admin = User.objects.create_user(username='stress_admin', password='password', role=User.Role.ADMIN)
+        customer = Customer.objects.create(name='Stress Customer', city=Customer.City.CAIRO)
+        hot = [
+            Product.objects.create(sku=f'{PREFIX}HOT-{i}', name=f'Stress Hot Part {i}', stock_quantity=options['stock'],
+                                   cost_price=Decimal('5.00'), selling_price=Decimal('10.00'))
+            for i in range(2)
+        ]
+        initial = {product.pk: product.stock_quantity for product in hot}
+
+        rng = random.Random(18)
+        order_ids = []
+        for _ in range(options['orders']):
+            order = Order.objects.create(customer=customer, created_by=admin, status=Order.Status.DRAFT)
+            # Lines in random SKU order, so only the lock ordering keeps two approvals from deadlocking.
+            lines = rng.sample(hot, len(hot))
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=p, quantity=rng.randint(1, 3)) for p in lines])
+            order_ids.append(order.pk)
+
+        factory = APIRequestFactory()
+        view = OrderViewSet.as_view({'post': 'status_update'})
+        outcomes = {}
+        outcomes_lock = threading.Lock()
+
+        def transition(order_id, new_status):
+            request = factory.post(f'/api/orders/{order_id}/status_update/', {'status': new_status}, format='json')
+            force_authenticate(request, user=admin)
+            response = view(request, pk=order_id)
+            with outcomes_lock:
+                outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+            return response.status_code
+
+        def approve(order_id):
+            try:
+                if transition(order_id, Order.Status.PENDING_APPROVAL) == 200:
+                    transition(order_id, Order.Status.APPROVED)
+            finally:
+                connections.close_all()
+
+        # Every order is submitted twice concurrently: the duplicate must not deduct stock again.
+        jobs = order_ids + rng.sample(order_ids, len(order_ids))
+        rng.shuffle(jobs)
+        self.stdout.write(f"Approving {len(order_ids)} orders on {len(hot)} hot SKUs with {options['threads']} threads...")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(approve, jobs))
+        elapsed = time.perf_counter() - started
+
+        transitions = sum(outcomes.values())
+        rate = transitions / elapsed
+        approved = Order.objects.filter(pk__in=order_ids, status=Order.Status.APPROVED).count()
+        self.stdout.write(f"{transitions} transitions in {elapsed:.2f}s ({rate:.0f}/s), {approved} orders approved, responses {outcomes}")
+
+        failures = []
+        if outcomes.get(500):
+            failures.append(f"{outcomes[500]} request(s) failed with a server error")
+
+        holding = (
+            OrderItem.objects.filter(order_id__in=order_ids, order__status__in=HOLDING_STATES)
+            .values('product').annotate(total=Sum('quantity'))
+        )
+        held = {row['product']: row['total'] for row in holding}
+        products = with_ledger_stock(
+            Product.objects.filter(pk__in=initial).annotate(expected_locked=expected_locked_stock())
+        )
+        for product in products:
+            expected = initial[product.pk] - held.get(product.pk, 0)
+            if product.stock_quantity < 0:
+                failures.append(f"{product.sku}: oversold, stock_quantity={product.stock_quantity}")
+            if product.stock_quantity != expected:
+                failures.append(f"{product.sku}: stock_quantity={product.stock_quantity}, expected {expected} (lost update)")
+            if product.locked_stock != product.expected_locked:
+                failures.append(f"{product.sku}: locked_stock={product.locked_stock}, expected {product.expected_locked}")
+            if product.ledger_quantity != product.stock_quantity:
+                failures.append(f"{product.sku}: movement ledger says {product.ledger_quantity}")
+            self.stdout.write(f"{product.sku}: {initial[product.pk]} -> {product.stock_quantity} in stock, {product.locked_stock} locked")
+
+        still_open = Order.objects.filter(pk__in=order_ids, status__in=LOCKED_STATES).exclude(status=Order.Status.APPROVED)
+        if still_open.exists():
+            failures.append(f"{still_open.count()} order(s) stuck in PENDING_APPROVAL")
+        if rate < options['min_rate']:
+            failures.append(f"throughput {rate:.0f}/s is below --min-rate {options['min_rate']:.0f}/s")
+
+        for failure in failures:
+            self.stdout.write(self.style.ERROR(failure))
+        if failures:
+            raise CommandError(f"{len(failures)} check(s) failed")
+        self.stdout.write(self.style.SUCCESS("No oversell or lost updates"))
@@ -1,8 +1,10 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from core.models import Order, Product, Customer
+from core.models import CashLedgerEntry, Order, Product, Customer
 from rest_framework.test import APIRequestFactory, force_authenticate
 from core.views import DashboardStatsViewSet, UserViewSet
+from core.rollups import order_changed, order_state
+from django.db.models import OuterRef, Subquery, Sum
 from decimal import Decimal
 
 User = get_user_model()
@@ -15,6 +17,7 @@ class Command(BaseCommand):
         
         # Cleanup
         Order.objects.filter(created_by__username__in=['test_rep']).delete()
+        CashLedgerEntry.objects.filter(user__username__in=['test_rep']).delete()
         User.objects.filter(username__in=['test_rep']).delete()
         
         # Setup
@@ -22,17 +25,22 @@ class Command(BaseCommand):
         customer, _ = Customer.objects.get_or_create(name='Test Customer')
         
         # Create orders in different statuses
+        orders = []
         # 1. Delivered (Should count as Cash on Hand) - 100.00
-        Order.objects.create(customer=customer, created_by=rep, total_amount=Decimal('100.00'), status=Order.Status.DELIVERED)
+        orders.append(Order.objects.create(customer=customer, created_by=rep, total_amount=Decimal('100.00'), status=Order.Status.DELIVERED))
         
         # 2. Delivered (Should count as Cash on Hand) - 50.50
-        Order.objects.create(customer=customer, created_by=rep, total_amount=Decimal('50.50'), status=Order.Status.DELIVERED)
+        orders.append(Order.objects.create(customer=customer, created_by=rep, total_amount=Decimal('50.50'), status=Order.Status.DELIVERED))
         
         # 3. Settled (Should NOT count) - 200.00
-        Order.objects.create(customer=customer, created_by=rep, total_amount=Decimal('200.00'), status=Order.Status.SETTLED)
+        orders.append(Order.objects.create(customer=customer, created_by=rep, total_amount=Decimal('200.00'), status=Order.Status.SETTLED))
         
         # 4. Draft (Should NOT count) - 10.00
-        Order.objects.create(customer=customer, created_by=rep, total_amount=Decimal('10.00'), status=Order.Status.DRAFT)
+        orders.append(Order.objects.create(customer=customer, created_by=rep, total_amount=Decimal('10.00'), status=Order.Status.DRAFT))
+
+        # Record them in the dashboard rollups and cash ledger the way the API does
+        for order in orders:
+            order_changed(None, order_state(order))
         
         factory = APIRequestFactory()
 
@@ -65,12 +73,12 @@ class Command(BaseCommand):
              admin = User.objects.create_user(username='admin_check', role=User.Role.ADMIN)
              
         view = UserViewSet.as_view({'get': 'list'})
-        req = factory.get('/api/users/')
+        req = factory.get('/api/users/', {'username': 'test_rep'})
         force_authenticate(req, user=admin)
         res = view(req)
         
         # Find test_rep in response
-        rep_data = next((u for u in res.data if u['username'] == 'test_rep'), None)
+        rep_data = next((u for u in res.data['results'] if u['username'] == 'test_rep'), None)
         
         if rep_data:
             user_cash = Decimal(str(rep_data.get('cash_on_hand', 0)))
@@ -81,6 +89,31 @@ class Command(BaseCommand):
         else:
              self.stdout.write(self.style.ERROR("FAIL (test_rep not found in list)"))
 
+        # ==========================================
+        # TEST 3: Ledger consistency (all users)
+        # ==========================================
+        self.stdout.write("Test 3: Cash ledger matches delivered orders... ", ending='')
+        last_balance = (
+            CashLedgerEntry.objects.filter(user=OuterRef('pk')).order_by('-id').values('balance_after')[:1]
+        )
+        mismatched = []
+        delivered = dict(
+            Order.objects.filter(status=Order.Status.DELIVERED)
+            .order_by()
+            .values('created_by')
+            .annotate(total=Sum('total_amount'))
+            .values_list('created_by', 'total')
+        )
+        for user in User.objects.annotate(last_balance=Subquery(last_balance)):
+            expected = delivered.get(user.pk) or Decimal('0.00')
+            if user.cash_on_hand != expected or (user.last_balance or Decimal('0.00')) != user.cash_on_hand:
+                mismatched.append(f"{user.username}: column={user.cash_on_hand} ledger={user.last_balance} delivered={expected}")
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("PASS"))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAIL ({'; '.join(mismatched)})"))
+
         # Cleanup
         # Order.objects.filter(created_by=rep).delete()
         # rep.delete()
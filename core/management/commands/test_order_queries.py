@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from core.models import Order, OrderItem, Product, Customer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.views import OrderViewSet
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Verify the order list renders in a constant number of queries'
+
+    def handle(self, *args, **kwargs):
+        # Everything created here is rolled back at the end.
+        try:
+            with transaction.atomic():
+                self.run_checks()
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run_checks(self):
+        admin = User.objects.create_user(username='test_query_admin', password='password', role=User.Role.ADMIN)
+        customer = Customer.objects.create(name='Query Count Customer', city=Customer.City.CAIRO)
+        products = [
+            Product(sku=f'QC-{i:03d}', name=f'Query Part {i}', stock_quantity=100,
+                    cost_price=Decimal('5.00'), selling_price=Decimal('10.00'))
+            for i in range(5)
+        ]
+        products = Product.objects.bulk_create(products)
+
+        def add_orders(count):
+            for _ in range(count):
+                order = Order.objects.create(customer=customer, created_by=admin, status=Order.Status.DRAFT)
+                OrderItem.objects.bulk_create([OrderItem(order=order, product=p, quantity=1) for p in products])
+
+        factory = APIRequestFactory()
+        view = OrderViewSet.as_view({'get': 'list'})
+
+        def count_queries():
+            req = factory.get('/api/orders/', {'page_size': 500})
+            force_authenticate(req, user=admin)
+            with CaptureQueriesContext(connection) as ctx:
+                res = view(req)
+                res.render()
+            return len(ctx.captured_queries), len(res.data['results'])
+
+        add_orders(5)
+        small, small_rows = count_queries()
+        add_orders(45)
+        large, large_rows = count_queries()
+
+        self.stdout.write(f"{small_rows} orders: {small} queries, {large_rows} orders: {large} queries... ", ending='')
+        if small != large:
+            self.stdout.write(self.style.ERROR("FAIL"))
+            raise CommandError("Order list query count grows with the number of orders")
+        self.stdout.write(self.style.SUCCESS("PASS"))
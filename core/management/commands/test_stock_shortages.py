@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.models import Product
+from core.stock import InsufficientStock, apply_stock_deltas
+from decimal import Decimal
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Verify a failed stock deduction reports only the short products, with their stock before the request'
+
+    def handle(self, *args, **kwargs):
+        # Everything created here is rolled back at the end.
+        try:
+            with transaction.atomic():
+                self.run_checks()
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run_checks(self):
+        plenty, short = Product.objects.bulk_create([
+            Product(sku='SC-A', name='Shortage Part A', stock_quantity=10,
+                    cost_price=Decimal('5.00'), selling_price=Decimal('10.00')),
+            Product(sku='SC-B', name='Shortage Part B', stock_quantity=1,
+                    cost_price=Decimal('5.00'), selling_price=Decimal('10.00')),
+        ])
+
+        self.stdout.write("Mixed deduction (A: 6 of 10, B: 5 of 1)... ", ending='')
+        try:
+            apply_stock_deltas({plenty.pk: -6, short.pk: -5})
+        except InsufficientStock as exc:
+            shortages = [(s['sku'], s['requested'], s['available']) for s in exc.shortages]
+        else:
+            self.stdout.write(self.style.ERROR("FAIL"))
+            raise CommandError("The deduction went through although B is short")
+
+        stock = dict(Product.objects.filter(pk__in=[plenty.pk, short.pk]).values_list('sku', 'stock_quantity'))
+        if shortages != [('SC-B', 5, 1)] or stock != {'SC-A': 10, 'SC-B': 1}:
+            self.stdout.write(self.style.ERROR("FAIL"))
+            raise CommandError(f"Expected only SC-B short with 1 available and stock untouched; got {shortages}, stock {stock}")
+        self.stdout.write(self.style.SUCCESS("PASS"))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:50
+
+from django.db import migrations, models
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_locked_stock(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    OrderItem = apps.get_model('core', 'OrderItem')
+    locked_lines = (
+        OrderItem.objects.filter(product=OuterRef('pk'), order__status__in=['PENDING_APPROVAL', 'APPROVED'])
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    Product.objects.update(
+        locked_stock=Coalesce(Subquery(locked_lines, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_invoice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='locked_stock',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Units on Pending/Approved orders'),
+        ),
+        migrations.RunPython(populate_locked_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:56
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def seed_invoice_sequence(apps, schema_editor):
+    # Continue numbering where the old count()-based scheme left off.
+    Order = apps.get_model('core', 'Order')
+    Invoice = apps.get_model('core', 'Invoice')
+    issued = (
+        Invoice.objects.filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    Order.objects.update(
+        invoice_sequence=Coalesce(Subquery(issued, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='document',
+            field=models.FileField(blank=True, upload_to='invoices/'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='render_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='render_claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='render_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='render_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('RENDERING', 'Rendering'), ('DONE', 'Done'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='invoice_sequence',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of the last invoice issued'),
+        ),
+        migrations.RunPython(seed_invoice_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:58
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_customer_totals(apps, schema_editor):
+    Customer = apps.get_model('core', 'Customer')
+    Order = apps.get_model('core', 'Order')
+    purchases = (
+        Order.objects.filter(customer=OuterRef('pk'), status__in=['DELIVERED', 'SETTLED'])
+        .order_by()
+        .values('customer')
+    )
+    Customer.objects.update(
+        total_purchases=Coalesce(
+            Subquery(purchases.annotate(total=Sum('total_amount')).values('total'), output_field=DecimalField()),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(),
+        ),
+        order_count=Coalesce(
+            Subquery(purchases.annotate(count=Count('id')).values('count'), output_field=IntegerField()),
+            Value(0),
+        ),
+        last_order_date=Subquery(purchases.annotate(latest=Max('created_at')).values('latest')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_invoice_rendering_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_date',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='total_purchases',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14),
+        ),
+        migrations.RunPython(backfill_customer_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:00
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def open_cash_ledger(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    Order = apps.get_model('core', 'Order')
+    CashLedgerEntry = apps.get_model('core', 'CashLedgerEntry')
+    balances = (
+        Order.objects.filter(status='DELIVERED')
+        .order_by()
+        .values('created_by')
+        .annotate(total=Sum('total_amount'))
+        .values_list('created_by', 'total')
+    )
+    entries = []
+    for user_id, total in balances:
+        if not total:
+            continue
+        User.objects.filter(pk=user_id).update(cash_on_hand=total)
+        entries.append(CashLedgerEntry(user_id=user_id, kind='ADJUSTMENT', amount=total, balance_after=total))
+    CashLedgerEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_customer_lifetime_value'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cash_on_hand',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=14),
+        ),
+        migrations.CreateModel(
+            name='CashLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('COLLECTION', 'Collection'), ('SETTLEMENT', 'Settlement'), ('ADJUSTMENT', 'Adjustment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cash_entries', to='core.order')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cash_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='cash_entry_user_idx')],
+            },
+        ),
+        migrations.RunPython(open_cash_ledger, migrations.RunPython.noop),
+    ]
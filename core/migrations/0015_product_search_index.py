@@ -0,0 +1,111 @@
+from django.db import migrations
+
+# The SQL is frozen here as it was when this migration was written; core.search keeps
+# its own copy for rebuild_search_index, and later changes there must not alter history.
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_product_fts USING fts5(
+        sku, name, category, description,
+        tokenize = "unicode61 remove_diacritics 2",
+        prefix = '2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER core_product_fts_insert AFTER INSERT ON core_product BEGIN
+        INSERT INTO core_product_fts (rowid, sku, name, category, description)
+        VALUES (new.id, new.sku, new.name, new.category, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_product_fts_update AFTER UPDATE OF sku, name, category, description ON core_product BEGIN
+        UPDATE core_product_fts
+        SET sku = new.sku, name = new.name, category = new.category, description = new.description
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_product_fts_delete AFTER DELETE ON core_product BEGIN
+        DELETE FROM core_product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    INSERT INTO core_product_fts (rowid, sku, name, category, description)
+    SELECT id, sku, name, category, description FROM core_product
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS core_product_fts_insert",
+    "DROP TRIGGER IF EXISTS core_product_fts_update",
+    "DROP TRIGGER IF EXISTS core_product_fts_delete",
+    "DROP TABLE IF EXISTS core_product_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE core_product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', regexp_replace(sku, '[^[:alnum:]]+', ' ', 'g')), 'A')
+        || setweight(to_tsvector('simple', name), 'B')
+        || setweight(to_tsvector('simple', category), 'C')
+        || setweight(to_tsvector('simple', description), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX core_product_search_vector_idx ON core_product USING gin (search_vector)",
+    "CREATE INDEX core_product_sku_trgm_idx ON core_product USING gin (sku gin_trgm_ops)",
+    "CREATE INDEX core_product_name_trgm_idx ON core_product USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS core_product_name_trgm_idx",
+    "DROP INDEX IF EXISTS core_product_sku_trgm_idx",
+    "DROP INDEX IF EXISTS core_product_search_vector_idx",
+    "ALTER TABLE core_product DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.fts5_probe")
+            return True
+        except Exception:
+            return False
+
+
+def create_search_index(apps, schema_editor):
+    # Databases without FTS5 or Postgres keep using icontains lookups for product search.
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and _sqlite_has_fts5(connection):
+        statements = SQLITE_FORWARD
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    else:
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def remove_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    statements = {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_cash_ledger'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, remove_search_index),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def opening_snapshots(apps, schema_editor):
+    # Current stock becomes the baseline every later movement is applied to.
+    Product = apps.get_model('core', 'Product')
+    StockSnapshot = apps.get_model('core', 'StockSnapshot')
+    StockSnapshot.objects.bulk_create(
+        (
+            StockSnapshot(product_id=product_id, quantity=quantity, movement_id=0)
+            for product_id, quantity in Product.objects.values_list('id', 'stock_quantity').iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('RECEIPT', 'Receipt'), ('RESERVATION', 'Reservation'), ('RELEASE', 'Release'), ('ADJUSTMENT', 'Adjustment')], max_length=20)),
+                ('quantity', models.IntegerField(help_text='Signed change to stock_quantity')),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='core.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='core.product')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'id'], name='movement_product_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('movement_id', models.BigIntegerField(help_text='Last InventoryMovement included in quantity')),
+                ('taken_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-movement_id'], name='snapshot_product_idx')],
+            },
+        ),
+        migrations.RunPython(opening_snapshots, migrations.RunPython.noop),
+    ]
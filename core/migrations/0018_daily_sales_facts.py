@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:31
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_order_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('week', models.DateField()),
+                ('month', models.DateField()),
+                ('city', models.CharField(blank=True, max_length=50)),
+                ('category', models.CharField(choices=[('SPARE_PART', 'Spare Part'), ('ACCESSORIES', 'Accessories'), ('OTHERS', 'Others')], max_length=50)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('discount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('sales_rep', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date', 'category'], name='category_fact_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'sales_rep', 'city', 'category'), name='unique_daily_category_fact')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('week', models.DateField(help_text='Monday of the week of `date`')),
+                ('month', models.DateField(help_text='First day of the month of `date`')),
+                ('city', models.CharField(blank=True, max_length=50)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('discount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('sales_rep', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date'], name='sales_fact_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'sales_rep', 'city'), name='unique_daily_sales_fact')],
+            },
+        ),
+    ]
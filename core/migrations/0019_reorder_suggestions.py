@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:50
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_daily_sales_facts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reorder_suggestion', serialize=False, to='core.product')),
+                ('units_sold', models.PositiveIntegerField(default=0, help_text='Units ordered in the history window')),
+                ('daily_velocity', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=10)),
+                ('available', models.IntegerField(help_text='stock_quantity when the forecast was computed')),
+                ('days_of_cover', models.DecimalField(blank=True, decimal_places=1, max_digits=8, null=True)),
+                ('reorder_point', models.PositiveIntegerField(default=0)),
+                ('suggested_quantity', models.PositiveIntegerField(default=0)),
+                ('needs_reorder', models.BooleanField(db_index=True, default=False)),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
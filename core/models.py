@@ -1,8 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.translation import gettext_lazy as _
 from decimal import Decimal
 
+# Products below this many units count as low stock; product_low_stock_idx is built on it.
+LOW_STOCK_THRESHOLD = 10
+
 class User(AbstractUser):
     class Role(models.TextChoices):
         ADMIN = 'ADMIN', 'Admin'
@@ -10,12 +14,15 @@ class User(AbstractUser):
         WAREHOUSE = 'WAREHOUSE', 'Warehouse'
 
     role = models.CharField(max_length=20, choices=Role.choices, default=Role.SALES_REP)
+    # Running balance of CashLedgerEntry rows: cash collected on DELIVERED orders, not yet settled
+    cash_on_hand = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), editable=False)
 
 class Product(models.Model):
     sku = models.CharField(max_length=50, unique=True, db_index=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     stock_quantity = models.PositiveIntegerField(default=0)
+    locked_stock = models.PositiveIntegerField(default=0, editable=False, help_text="Units on Pending/Approved orders")
     cost_price = models.DecimalField(max_digits=10, decimal_places=2, help_text="Cost Price (Hidden from Sales)")
     selling_price = models.DecimalField(max_digits=10, decimal_places=2)
     
@@ -26,8 +33,17 @@ class Product(models.Model):
 
     category = models.CharField(max_length=50, choices=Category.choices, default=Category.OTHERS)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
-
+    class Meta:
+        indexes = [
+            # Dashboard low-stock count: only the few products under the threshold are in the index.
+            models.Index(
+                fields=['stock_quantity'],
+                condition=models.Q(stock_quantity__lt=LOW_STOCK_THRESHOLD),
+                name='product_low_stock_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.sku} - {self.name}"
@@ -66,6 +82,12 @@ class Customer(models.Model):
     city = models.CharField(max_length=50, choices=City.choices, blank=True, null=True)
     address = models.TextField(blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Lifetime value over DELIVERED/SETTLED orders, maintained by core.rollups
+    total_purchases = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'), editable=False, db_index=True)
+    order_count = models.PositiveIntegerField(default=0, editable=False)
+    last_order_date = models.DateTimeField(null=True, blank=True, editable=False)
     
     def __str__(self):
         return self.name
@@ -88,6 +110,25 @@ class Order(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name='orders')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    invoice_sequence = models.PositiveIntegerField(default=0, editable=False, help_text="Number of the last invoice issued")
+
+    class Meta:
+        indexes = [
+            # Order list (newest first) and created_at range filters.
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+            # A sales rep's own order list, newest first.
+            models.Index(fields=['created_by', '-created_at'], name='order_creator_created_idx'),
+            # A rep's orders in one status.
+            models.Index(fields=['created_by', 'status'], name='order_creator_status_idx'),
+            # Status filter combined with a date range.
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            # Orders holding locked stock: a small slice of the table, so the index stays small.
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(status__in=['PENDING_APPROVAL', 'APPROVED']),
+                name='order_open_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.customer.name if self.customer else 'Unknown'}"
@@ -97,15 +138,219 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.PositiveIntegerField()
 
+    class Meta:
+        indexes = [
+            # Lines of a product by order: locked_stock and sales per product join through here.
+            models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+        ]
 
     def __str__(self):
         return f"{self.order.id} - {self.product.sku} (x{self.quantity})"
 
 class Invoice(models.Model):
+    class RenderStatus(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        RENDERING = 'RENDERING', 'Rendering'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='invoices')
     invoice_number = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
     invoice_data = models.JSONField()
 
+    # Rendering queue: run_invoice_worker picks up PENDING rows and caches the document on disk
+    render_status = models.CharField(max_length=20, choices=RenderStatus.choices, default=RenderStatus.PENDING, db_index=True)
+    render_claimed_at = models.DateTimeField(null=True, blank=True)
+    render_attempts = models.PositiveIntegerField(default=0)
+    render_error = models.TextField(blank=True)
+    document = models.FileField(upload_to='invoices/', blank=True)
+
     def __str__(self):
         return f"Invoice {self.invoice_number}"
+
+class OrderStatusRollup(models.Model):
+    """Running order count and amount per (sales rep, status); feeds the dashboard."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='status_rollups')
+    status = models.CharField(max_length=30, choices=Order.Status.choices)
+    order_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'status'], name='unique_status_rollup_per_user'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.status}: {self.order_count} / {self.total_amount}"
+
+class Tombstone(models.Model):
+    """Marks a deleted Product/Customer so incremental sync clients can drop it."""
+    class Kind(models.TextChoices):
+        PRODUCT = 'product', 'Product'
+        CUSTOMER = 'customer', 'Customer'
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} deleted {self.deleted_at}"
+
+class CacheVersion(models.Model):
+    """
+    Version counter of a model's cached API responses (see core.response_cache). Kept in
+    the database so a bump made by one worker is seen by every worker.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+class CashLedgerEntry(models.Model):
+    """Append-only movement of a rep's cash on hand; balance_after is User.cash_on_hand after it."""
+    class Kind(models.TextChoices):
+        COLLECTION = 'COLLECTION', 'Collection'
+        SETTLEMENT = 'SETTLEMENT', 'Settlement'
+        ADJUSTMENT = 'ADJUSTMENT', 'Adjustment'
+
+    user = models.ForeignKey(User, on_delete=models.PROTECT, related_name='cash_entries')
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='cash_entries')
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'], name='cash_entry_user_idx')]
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.amount} -> {self.balance_after}"
+
+class InventoryMovement(models.Model):
+    """
+    Append-only record of every change to Product.stock_quantity. Orders write
+    RESERVATION (stock taken) and RELEASE (stock returned); receipts and stock counts
+    write RECEIPT and ADJUSTMENT.
+    """
+    class Kind(models.TextChoices):
+        RECEIPT = 'RECEIPT', 'Receipt'
+        RESERVATION = 'RESERVATION', 'Reservation'
+        RELEASE = 'RELEASE', 'Release'
+        ADJUSTMENT = 'ADJUSTMENT', 'Adjustment'
+
+    # PROTECT: the ledger is append-only, so a product with stock history cannot be deleted.
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='movements')
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    quantity = models.IntegerField(help_text="Signed change to stock_quantity")
+    order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='movements')
+    reference = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'id'], name='movement_product_idx')]
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity:+d} {self.product_id}"
+
+class StockSnapshot(models.Model):
+    """Stock of a product as of movement `movement_id`; later movements are added on top."""
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='snapshots')
+    quantity = models.IntegerField()
+    movement_id = models.BigIntegerField(help_text="Last InventoryMovement included in quantity")
+    taken_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['product', '-movement_id'], name='snapshot_product_idx')]
+
+    def __str__(self):
+        return f"{self.product_id} = {self.quantity} @ {self.movement_id}"
+
+class DailySalesFact(models.Model):
+    """
+    DELIVERED/SETTLED orders summed per order day, sales rep and customer city.
+    Maintained by core.analytics; `city` is '' for orders without a customer city.
+    week/month are stored so reports group on plain columns instead of truncating dates.
+    """
+    date = models.DateField()
+    week = models.DateField(help_text="Monday of the week of `date`")
+    month = models.DateField(help_text="First day of the month of `date`")
+    sales_rep = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    city = models.CharField(max_length=50, blank=True)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'sales_rep', 'city'], name='unique_daily_sales_fact'),
+        ]
+        indexes = [models.Index(fields=['date'], name='sales_fact_date_idx')]
+
+    def __str__(self):
+        return f"{self.date} {self.sales_rep_id} {self.city}: {self.revenue}"
+
+class DailyCategorySalesFact(models.Model):
+    """DailySalesFact split by product category; order_count counts orders with lines in the category."""
+    date = models.DateField()
+    week = models.DateField()
+    month = models.DateField()
+    sales_rep = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    city = models.CharField(max_length=50, blank=True)
+    category = models.CharField(max_length=50, choices=Product.Category.choices)
+    order_count = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'sales_rep', 'city', 'category'], name='unique_daily_category_fact'),
+        ]
+        indexes = [models.Index(fields=['date', 'category'], name='category_fact_date_idx')]
+
+    def __str__(self):
+        return f"{self.date} {self.sales_rep_id} {self.city} {self.category}: {self.revenue}"
+
+class ReorderSuggestion(models.Model):
+    """
+    Nightly replenishment forecast of one product, written by core.replenishment.
+    Velocity is average daily units on orders in the stock-holding states over the
+    history window; days_of_cover is None for products with no demand in it.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='reorder_suggestion')
+    units_sold = models.PositiveIntegerField(default=0, help_text="Units ordered in the history window")
+    daily_velocity = models.DecimalField(max_digits=10, decimal_places=3, default=Decimal('0.000'))
+    available = models.IntegerField(help_text="stock_quantity when the forecast was computed")
+    days_of_cover = models.DecimalField(max_digits=8, decimal_places=1, null=True, blank=True)
+    reorder_point = models.PositiveIntegerField(default=0)
+    suggested_quantity = models.PositiveIntegerField(default=0)
+    needs_reorder = models.BooleanField(default=False, db_index=True)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.product_id}: {self.days_of_cover} days, reorder {self.suggested_quantity}"
+
+class Event(models.Model):
+    """
+    A change pushed to clients over /api/events/ (see core.events). Events with an
+    owner follow order visibility: the owning sales rep, Admin and Warehouse see them;
+    events without one go to every user.
+    """
+    class Kind(models.TextChoices):
+        ORDER_STATUS = 'order.status', 'Order status changed'
+        STOCK = 'product.stock', 'Stock changed'
+        INVOICE = 'invoice.created', 'Invoice created'
+
+    kind = models.CharField(max_length=30, choices=Kind.choices)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.id} {self.kind}"
@@ -0,0 +1,176 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .search import SEARCH_RANK
+
+COUNT_QUERY_PARAM = 'count'
+COUNT_ESTIMATE = 'estimate'
+
+
+def estimate_count(queryset):
+    """
+    Planner row estimate for `queryset` on Postgres (no table scan). Other backends
+    have no cheap estimate, so they fall back to an exact COUNT(*).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def wants_estimated_count(request):
+    return request.query_params.get(COUNT_QUERY_PARAM) == COUNT_ESTIMATE
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(state):
+    """Opaque continuation token carrying a JSON-serializable paging state."""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode()).decode()
+
+
+def decode_cursor(token):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+
+
+def updated_since_page(queryset, after, limit):
+    """
+    Up to `limit` rows of `queryset` in (updated_at, id) order, starting after the
+    position `after` ([updated_at ISO string, id], or None for the start). Returns the
+    rows and the position to continue from, None once nothing is left.
+    """
+    queryset = queryset.order_by('updated_at', 'id')
+    if after is not None:
+        updated_at, pk = parse_datetime(after[0]), int(after[1])
+        if updated_at is None:
+            raise InvalidCursor("Invalid cursor")
+        queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, [rows[-1].updated_at.isoformat(), rows[-1].pk]
+
+
+class OffsetPagination(LimitOffsetPagination):
+    """
+    ?limit=&offset= paging. With ?count=estimate the exact COUNT(*) is replaced by the
+    planner estimate and the next link is decided by over-fetching one row.
+    """
+    max_limit = settings.API_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.estimated = wants_estimated_count(request)
+        if not self.estimated:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = estimate_count(queryset)
+
+        rows = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        return rows[:self.limit]
+
+    def get_next_link(self):
+        if not self.estimated:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param, self.offset + self.limit)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_is_estimate'] = self.estimated
+        return response
+
+
+class CursorOrOffsetPagination(CursorPagination):
+    """
+    Keyset (cursor) paging by default; requests that pass ?limit= or ?offset= are
+    served by OffsetPagination instead. ?count=estimate adds a cheap row estimate.
+    Subclasses set `ordering` to a unique (or unique-terminated) key.
+    """
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    offset_pagination_class = OffsetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.offset_paginator = None
+        self.estimated_count = None
+
+        if OffsetPagination.limit_query_param in params or OffsetPagination.offset_query_param in params:
+            self.offset_paginator = self.offset_pagination_class()
+            if not queryset.ordered:
+                queryset = queryset.order_by(*self.ordering)
+            return self.offset_paginator.paginate_queryset(queryset, request, view)
+
+        if wants_estimated_count(request):
+            self.estimated_count = estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_paginated_response(data)
+
+        body = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.estimated_count is not None:
+            body['count'] = self.estimated_count
+            body['count_is_estimate'] = True
+        body['results'] = data
+        return Response(body)
+
+    def get_html_context(self):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.get_html_context()
+        return super().get_html_context()
+
+    def to_html(self):
+        if self.offset_paginator is not None:
+            return self.offset_paginator.to_html()
+        return super().to_html()
+
+
+class OrderPagination(CursorOrOffsetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class ProductPagination(CursorOrOffsetPagination):
+    ordering = ('sku',)
+
+    def get_ordering(self, request, queryset, view):
+        # Ranked search results page best match first unless ?ordering= asks otherwise.
+        if SEARCH_RANK in queryset.query.annotations and not request.query_params.get('ordering'):
+            return (f'-{SEARCH_RANK}', 'sku')
+        return super().get_ordering(request, queryset, view)
+
+
+class MovementPagination(CursorOrOffsetPagination):
+    ordering = ('-id',)
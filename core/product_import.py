@@ -0,0 +1,216 @@
+import csv
+import io
+import os
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Product
+from .response_cache import bump_cache_version
+from .rollups import invalidate_low_stock
+from .suggest import suggest_index
+
+IMPORT_FIELDS = ['name', 'description', 'cost_price', 'selling_price', 'category']
+HEADER_ALIASES = {
+    'product': 'name',
+    'product_name': 'name',
+    'cost': 'cost_price',
+    'price': 'selling_price',
+    'unit_price': 'selling_price',
+}
+SKU_MAX_LENGTH = Product._meta.get_field('sku').max_length
+NAME_MAX_LENGTH = Product._meta.get_field('name').max_length
+MAX_PRICE = Decimal('99999999.99')
+CATEGORIES = {
+    **{value.lower(): value for value in Product.Category.values},
+    **{label.lower(): value for value, label in Product.Category.choices},
+}
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be read (unknown format, missing sku column, ...)."""
+
+
+def _header(cells):
+    columns = []
+    for cell in cells:
+        column = str(cell or '').strip().lower().replace(' ', '_')
+        columns.append(HEADER_ALIASES.get(column, column))
+    if 'sku' not in columns:
+        raise ImportFileError("The first row must be a header with at least a 'sku' column")
+    return columns
+
+
+def _csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    columns = _header(next(reader, []))
+    for row in reader:
+        yield dict(zip(columns, row))
+
+
+def _xlsx_rows(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("XLSX import needs the openpyxl package; upload a CSV instead")
+    # read_only streams rows from the archive instead of loading the whole sheet.
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = _header(next(rows, ()))
+        for row in rows:
+            yield dict(zip(columns, row))
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """Yield (row_number, {column: value}) from a CSV or XLSX file, numbered as in a spreadsheet."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        rows = _csv_rows(fileobj)
+    elif extension in ('.xlsx', '.xlsm'):
+        rows = _xlsx_rows(fileobj)
+    else:
+        raise ImportFileError("Unsupported file type; upload a .csv or .xlsx file")
+    for number, row in enumerate(rows, start=2):
+        if any(value not in (None, '') for value in row.values()):
+            yield number, row
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _price(value, field, errors):
+    text = _text(value)
+    if not text:
+        return None
+    try:
+        price = Decimal(text.replace(',', '')).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        errors.append(f"{field}: '{text}' is not a number")
+        return None
+    if price < 0 or price > MAX_PRICE:
+        errors.append(f"{field}: {price} is out of range")
+        return None
+    return price
+
+
+def clean_row(row):
+    """Return (sku, {field: value}, errors) with only the fields present in the row."""
+    errors = []
+    sku = _text(row.get('sku'))
+    if not sku:
+        errors.append("sku is required")
+    elif len(sku) > SKU_MAX_LENGTH:
+        errors.append(f"sku is longer than {SKU_MAX_LENGTH} characters")
+
+    values = {}
+    name = _text(row.get('name'))
+    if len(name) > NAME_MAX_LENGTH:
+        errors.append(f"name is longer than {NAME_MAX_LENGTH} characters")
+    elif name:
+        values['name'] = name
+    if row.get('description') not in (None, ''):
+        values['description'] = _text(row['description'])
+    for field in ('cost_price', 'selling_price'):
+        price = _price(row.get(field), field, errors)
+        if price is not None:
+            values[field] = price
+    category = _text(row.get('category'))
+    if category:
+        if category.lower() not in CATEGORIES:
+            errors.append(f"category: '{category}' is not one of {', '.join(Product.Category.values)}")
+        else:
+            values['category'] = CATEGORIES[category.lower()]
+    return sku, values, errors
+
+
+class ProductImport:
+    """
+    Upserts products from rows of (row_number, row) in chunks of PRODUCT_IMPORT_CHUNK_SIZE:
+    one SELECT of the chunk's existing SKUs, then one INSERT ... ON CONFLICT (sku) DO UPDATE
+    for the rows that actually change. Bad rows are reported and skipped; with
+    dry_run nothing is written and `changes` lists what would be.
+
+    Only catalog fields are imported; stock levels stay with the stock engine.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.report = {'dry_run': dry_run, 'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'errors': [], 'changes': []}
+        self._seen = set()
+        self._written = []
+
+    def run(self, rows):
+        chunk_size = settings.PRODUCT_IMPORT_CHUNK_SIZE
+        with transaction.atomic():
+            chunk = []
+            for number, row in rows:
+                self.report['rows'] += 1
+                sku, values, errors = clean_row(row)
+                if sku in self._seen:
+                    errors.append("sku appears earlier in the file")
+                if errors:
+                    self.report['errors'].append({'row': number, 'sku': sku, 'errors': errors})
+                    continue
+                self._seen.add(sku)
+                chunk.append((number, sku, values))
+                if len(chunk) >= chunk_size:
+                    self._import_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self._import_chunk(chunk)
+            if self._written and not self.dry_run:
+                bump_cache_version(Product)
+                invalidate_low_stock()
+                transaction.on_commit(self._update_suggest_index)
+        return self.report
+
+    def _import_chunk(self, chunk):
+        existing = {product.sku: product for product in Product.objects.filter(sku__in=[sku for _, sku, _ in chunk])}
+        to_write = []
+        for number, sku, values in chunk:
+            product = existing.get(sku)
+            if product is None:
+                missing = [field for field in ('name', 'cost_price', 'selling_price') if field not in values]
+                if missing:
+                    self.report['errors'].append({'row': number, 'sku': sku, 'errors': [f"new product needs {', '.join(missing)}"]})
+                    continue
+                product = Product(sku=sku, **values)
+                self.report['created'] += 1
+                change = {field: [None, getattr(product, field)] for field in IMPORT_FIELDS}
+                action = 'create'
+            else:
+                change = {
+                    field: [getattr(product, field), value]
+                    for field, value in values.items() if getattr(product, field) != value
+                }
+                if not change:
+                    self.report['unchanged'] += 1
+                    continue
+                for field, value in values.items():
+                    setattr(product, field, value)
+                self.report['updated'] += 1
+                action = 'update'
+            if self.dry_run:
+                self.report['changes'].append({'row': number, 'sku': sku, 'action': action, 'fields': change})
+            to_write.append(product)
+
+        if to_write and not self.dry_run:
+            written = Product.objects.bulk_create(
+                to_write,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=IMPORT_FIELDS + ['updated_at'],
+            )
+            self._written.extend((p.pk, p.sku, p.name, p.category) for p in written if p.pk is not None)
+
+    def _update_suggest_index(self):
+        # bulk_create skips post_save; other processes pick the rows up on their next refresh.
+        if suggest_index.loaded:
+            for row in self._written:
+                suggest_index.upsert(*row)
@@ -0,0 +1,236 @@
+import datetime
+import itertools
+import time
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+from .analytics import SALES_STATES
+from .models import Order, OrderItem, Product, User
+
+# Report grouping -> what a row is keyed by.
+GROUPINGS = ['order', 'product', 'category', 'sales_rep']
+SORTS = ['margin', '-margin', 'margin_pct', '-margin_pct', 'revenue', '-revenue']
+
+# Rows fetched per round trip while filling the column arrays.
+FETCH_SIZE = 100000
+
+
+class ReportUnavailable(Exception):
+    pass
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ReportUnavailable("The profitability report needs the numpy package")
+    return numpy
+
+
+def _columns(np, queryset, fields, dtype):
+    """
+    Run `queryset.values_list(*fields)` on a raw cursor and return the result as one
+    (rows, len(fields)) array, skipping Django's per-row model and Decimal conversion.
+    """
+    sql, params = queryset.values_list(*fields).query.sql_with_params()
+    chunks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(np.fromiter(itertools.chain.from_iterable(rows), dtype=dtype, count=len(rows) * len(fields)))
+    if not chunks:
+        return np.empty((0, len(fields)), dtype=dtype)
+    return np.concatenate(chunks).reshape(-1, len(fields))
+
+
+def sales_orders(date_from=None, date_to=None):
+    """Sales orders created on local days [date_from, date_to]; either end may be open."""
+    tz = timezone.get_current_timezone()
+    orders = Order.objects.filter(status__in=SALES_STATES)
+    if date_from is not None:
+        orders = orders.filter(created_at__gte=timezone.make_aware(datetime.datetime.combine(date_from, datetime.time.min), tz))
+    if date_to is not None:
+        end = timezone.make_aware(datetime.datetime.combine(date_to, datetime.time.min), tz) + datetime.timedelta(days=1)
+        orders = orders.filter(created_at__lt=end)
+    return orders
+
+
+def load_lines(orders):
+    """
+    The columns the margin computation needs, as numpy arrays:
+    lines (order_id, product_id, quantity), orders (id, created_by_id, total_amount)
+    sorted by id, and products (id, selling_price, cost_price, category code) sorted by id.
+    Categories are coded by their position in Product.Category.values.
+    """
+    np = _numpy()
+    order_rows = _columns(np, orders.order_by('pk'), ['id', 'created_by_id', 'total_amount'], np.float64)
+    # Lines are read by order id range rather than joined to the orders, which streams
+    # them instead of probing the order_id index once per order; lines of orders outside
+    # the set are dropped by compute_margins.
+    if len(order_rows):
+        lines = OrderItem.objects.filter(order_id__gte=int(order_rows[0, 0]), order_id__lte=int(order_rows[-1, 0]))
+        lines = _columns(np, lines.order_by(), ['order_id', 'product_id', 'quantity'], np.int64)
+    else:
+        lines = np.empty((0, 3), dtype=np.int64)
+    categories = {category: code for code, category in enumerate(Product.Category.values)}
+    product_rows = np.array(
+        [
+            (pid, price, cost, categories.get(category, -1))
+            for pid, price, cost, category in Product.objects.order_by('pk').values_list(
+                'id', 'selling_price', 'cost_price', 'category'
+            )
+        ],
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    return lines, order_rows, product_rows
+
+
+def _positions(np, ids, wanted):
+    """Row of each of `wanted` in `ids`, or -1. Ids are dense enough for a direct lookup table."""
+    table = np.full(max(int(ids.max(initial=0)), int(wanted.max(initial=0))) + 1, -1, dtype=np.int64)
+    table[ids] = np.arange(len(ids))
+    return table[wanted]
+
+
+def compute_margins(lines, orders, products):
+    """
+    Price every line and sum it per order, product, category and rep, all as array
+    operations. Takes the arrays of load_lines; returns {grouping: (keys, units, revenue,
+    cost)} with one entry per key. Revenue is the order's stored total_amount (what the
+    sales analytics report), shared across its lines by their value at today's selling
+    price, or by quantity when that is zero; cost is quantity times today's cost_price.
+    """
+    np = _numpy()
+    order_ids = orders[:, 0].astype(np.int64)
+    product_ids = products[:, 0].astype(np.int64)
+    order_index = _positions(np, order_ids, lines[:, 0])
+    product_index = _positions(np, product_ids, lines[:, 1])
+    # The arrays come from separate reads; a line whose order left the sales states in
+    # between is dropped rather than priced.
+    matched = (order_index >= 0) & (product_index >= 0)
+    if not matched.all():
+        lines, order_index, product_index = lines[matched], order_index[matched], product_index[matched]
+
+    quantity = lines[:, 2].astype(np.float64)
+    value = quantity * products[product_index, 1]
+    order_value = np.bincount(order_index, weights=value, minlength=len(orders))
+    order_units = np.bincount(order_index, weights=quantity, minlength=len(orders))
+    priced = order_value[order_index] > 0
+    share = np.divide(
+        np.where(priced, value, quantity),
+        np.where(priced, order_value[order_index], order_units[order_index]),
+        out=np.zeros_like(quantity),
+        where=order_units[order_index] > 0,
+    )
+    revenue = orders[order_index, 2] * share
+    cost = quantity * products[product_index, 2]
+
+    reps, rep_index = np.unique(orders[:, 1].astype(np.int64), return_inverse=True)
+    # Category codes index Product.Category.values; the extra last slot catches unknown (-1) codes.
+    categories = np.arange(len(Product.Category.values) + 1)
+    categories[-1] = -1
+    category_index = products[:, 3].astype(np.int64)[product_index]
+    category_index[category_index < 0] = len(categories) - 1
+    groups = {
+        'order': (order_ids, order_index),
+        'product': (product_ids, product_index),
+        'category': (categories, category_index),
+        'sales_rep': (reps, rep_index[order_index]),
+    }
+
+    totals = {}
+    for grouping, (keys, index) in groups.items():
+        # bincount of an empty index comes back as int64; keep every sum float64.
+        sums = [
+            np.bincount(index, weights=column, minlength=len(keys)).astype(np.float64, copy=False)
+            for column in (quantity, revenue, cost)
+        ]
+        totals[grouping] = (keys, *sums)
+    return totals
+
+
+def _money(value):
+    return Decimal(f"{value:.2f}")
+
+
+def _rows(np, grouping, keys, units, revenue, cost, sort, limit):
+    margin = revenue - cost
+    margin_pct = np.divide(margin * 100, revenue, out=np.zeros_like(margin), where=revenue != 0)
+    # Orders, products and categories without lines in range have nothing to report;
+    # a rep's orders are all listed, even if every one of them is empty.
+    present = np.arange(len(keys)) if grouping == 'sales_rep' else np.flatnonzero(units)
+    column = {'margin': margin, 'margin_pct': margin_pct, 'revenue': revenue}[sort.lstrip('-')]
+    ranked = present[np.argsort(column[present], kind='stable')]
+    if sort.startswith('-'):
+        ranked = ranked[::-1]
+    ranked = ranked[:limit]
+
+    rows = [
+        {
+            'key': keys[i].item(),
+            'units': int(units[i]),
+            'revenue': _money(revenue[i]),
+            'cost': _money(cost[i]),
+            'margin': _money(margin[i]),
+            'margin_pct': round(float(margin_pct[i]), 2),
+        }
+        for i in ranked
+    ]
+    return rows
+
+
+def _label(grouping, rows):
+    # Names are looked up for the returned rows only, after ranking.
+    keys = [row.pop('key') for row in rows]
+    if grouping == 'category':
+        categories = Product.Category.values
+        for row, code in zip(rows, keys):
+            row['category'] = categories[code] if code >= 0 else None
+    elif grouping == 'product':
+        products = Product.objects.in_bulk(keys)
+        for row, pid in zip(rows, keys):
+            row.update(product=pid, sku=products[pid].sku, name=products[pid].name, category=products[pid].category)
+    elif grouping == 'sales_rep':
+        usernames = dict(User.objects.filter(pk__in=keys).values_list('id', 'username'))
+        for row, rep in zip(rows, keys):
+            row.update(sales_rep=rep, sales_rep_username=usernames.get(rep))
+    else:
+        reps = dict(Order.objects.filter(pk__in=keys).values_list('id', 'created_by__username'))
+        for row, order_id in zip(rows, keys):
+            row.update(order=order_id, sales_rep_username=reps.get(order_id))
+    return rows
+
+
+def profitability_report(group_by='product', date_from=None, date_to=None, sort='-margin', limit=100):
+    """
+    Gross margin of the sales orders created in [date_from, date_to], grouped by order,
+    product, category or sales rep. Returns (totals, rows, timings): overall units,
+    revenue, cost and margin, the first `limit` groups ranked by `sort`, and the load and
+    compute times in ms. Raises ReportUnavailable when numpy is not installed.
+    """
+    np = _numpy()
+    started = time.perf_counter()
+    lines, orders, products = load_lines(sales_orders(date_from, date_to))
+    loaded = time.perf_counter()
+    totals = compute_margins(lines, orders, products)
+    keys, units, revenue, cost = totals[group_by]
+    rows = _rows(np, group_by, keys, units, revenue, cost, sort, limit)
+    computed = time.perf_counter()
+
+    revenue_total, cost_total = float(revenue.sum()), float(cost.sum())
+    summary = {
+        'lines': len(lines),
+        'orders': len(orders),
+        'units': int(units.sum()),
+        'revenue': _money(revenue_total),
+        'cost': _money(cost_total),
+        'margin': _money(revenue_total - cost_total),
+        'margin_pct': round((revenue_total - cost_total) * 100 / revenue_total, 2) if revenue_total else 0.0,
+    }
+    timings = {'load': (loaded - started) * 1000, 'compute': (computed - loaded) * 1000}
+    return summary, _label(group_by, rows), timings
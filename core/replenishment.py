@@ -0,0 +1,133 @@
+import datetime
+import math
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import OrderItem, Product, ReorderSuggestion
+from .rollups import REORDER_CACHE_KEY
+from .stock import HOLDING_STATES
+
+# Suggestions written per INSERT.
+REORDER_BATCH_SIZE = 1000
+
+
+class ForecastUnavailable(Exception):
+    pass
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ForecastUnavailable("Reorder suggestions need the numpy package")
+    return numpy
+
+
+def history_window(today=None):
+    """The (first, last) local days whose orders feed the velocity: the REORDER_HISTORY_DAYS before `today`."""
+    today = today or timezone.localdate()
+    return today - datetime.timedelta(days=settings.REORDER_HISTORY_DAYS), today - datetime.timedelta(days=1)
+
+
+def daily_demand(np, product_ids, first_day, last_day):
+    """
+    (len(product_ids), days) matrix of units per product and local day on orders in
+    HOLDING_STATES (stock actually taken). One GROUP BY product query per day: the day
+    is known from the query, so no per-line date truncation. `product_ids` is sorted.
+    """
+    tz = timezone.get_current_timezone()
+    days = (last_day - first_day).days + 1
+    demand = np.zeros((len(product_ids), days))
+    for offset in range(days):
+        start = timezone.make_aware(datetime.datetime.combine(first_day + datetime.timedelta(days=offset), datetime.time.min), tz)
+        rows = list(
+            OrderItem.objects.filter(
+                order__status__in=HOLDING_STATES,
+                order__created_at__gte=start,
+                order__created_at__lt=start + datetime.timedelta(days=1),
+            )
+            .order_by()
+            .values_list('product_id')
+            .annotate(units=Sum('quantity'))
+        )
+        if not rows:
+            continue
+        ordered = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        positions = np.searchsorted(product_ids, ordered[:, 0]).clip(max=len(product_ids) - 1)
+        # Products created after product_ids was read have no row to land in.
+        known = product_ids[positions] == ordered[:, 0]
+        demand[positions[known], offset] = ordered[known, 1]
+    return demand
+
+
+def forecast(np, stock, demand, lead_time=None, cover_days=None, safety_z=None):
+    """
+    Reorder figures for a batch of products, as arrays: (units_sold, velocity,
+    days_of_cover, reorder_point, suggested_quantity, needs_reorder).
+
+    The reorder point is lead-time demand plus safety stock (safety_z standard
+    deviations of daily demand over the lead time). A product at or below it is
+    reordered up to lead-time demand plus `cover_days` of demand plus safety stock.
+    days_of_cover is NaN for products with no demand.
+    """
+    lead_time = settings.REORDER_LEAD_TIME_DAYS if lead_time is None else lead_time
+    cover_days = settings.REORDER_COVER_DAYS if cover_days is None else cover_days
+    safety_z = settings.REORDER_SAFETY_Z if safety_z is None else safety_z
+
+    units_sold = demand.sum(axis=1)
+    velocity = units_sold / demand.shape[1]
+    safety = safety_z * demand.std(axis=1) * math.sqrt(lead_time)
+    reorder_point = np.ceil(velocity * lead_time + safety)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(velocity > 0, stock / velocity, np.nan)
+    needs_reorder = (velocity > 0) & (stock <= reorder_point)
+    target = np.ceil(velocity * (lead_time + cover_days) + safety)
+    suggested = np.where(needs_reorder, np.maximum(target - stock, 0), 0)
+    return units_sold, velocity, days_of_cover, reorder_point, suggested, needs_reorder
+
+
+def compute_suggestions(today=None):
+    """
+    One unsaved ReorderSuggestion per product. Available stock is stock_quantity, which
+    every HOLDING order (locked ones included) has already been taken from.
+    Raises ForecastUnavailable without numpy.
+    """
+    np = _numpy()
+    first_day, last_day = history_window(today)
+    computed_at = timezone.now()
+    products = np.array(list(Product.objects.order_by('pk').values_list('id', 'stock_quantity')), dtype=np.int64).reshape(-1, 2)
+    if not len(products):
+        return []
+    product_ids, stock = products[:, 0], products[:, 1].astype(np.float64)
+    columns = forecast(np, stock, daily_demand(np, product_ids, first_day, last_day))
+    return [
+        ReorderSuggestion(
+            product_id=pid,
+            units_sold=int(units),
+            daily_velocity=Decimal(f"{velocity:.3f}"),
+            available=int(available),
+            days_of_cover=None if math.isnan(cover) else Decimal(f"{min(cover, 9999999):.1f}"),
+            reorder_point=int(point),
+            suggested_quantity=int(suggested),
+            needs_reorder=needed,
+            computed_at=computed_at,
+        )
+        for pid, available, units, velocity, cover, point, suggested, needed in zip(
+            product_ids.tolist(), stock.tolist(), *(column.tolist() for column in columns)
+        )
+    ]
+
+
+def rebuild_reorder_suggestions(today=None):
+    """Replace the ReorderSuggestion table with a fresh forecast. Returns (products, products to reorder)."""
+    suggestions = compute_suggestions(today)
+    with transaction.atomic():
+        ReorderSuggestion.objects.all().delete()
+        ReorderSuggestion.objects.bulk_create(suggestions, batch_size=REORDER_BATCH_SIZE)
+    cache.delete(REORDER_CACHE_KEY)
+    return len(suggestions), sum(suggestion.needs_reorder for suggestion in suggestions)
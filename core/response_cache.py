@@ -0,0 +1,79 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import CacheVersion
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def bump_cache_version(*models):
+    """Invalidate every cached response that depends on `models` (after the current transaction commits)."""
+    labels = sorted({_label(model) for model in models})
+
+    def bump():
+        for label in labels:
+            if not CacheVersion.objects.filter(name=label).update(version=F('version') + 1):
+                # Never bumped before; any fresh value differs from what readers seeded.
+                CacheVersion.objects.update_or_create(name=label, defaults={'version': time.time_ns()})
+    transaction.on_commit(bump)
+
+
+def cache_versions(models):
+    """
+    Current version of each of `models`, read from the database rather than the cache,
+    which may be per process.
+    """
+    labels = [_label(model) for model in models]
+    versions = dict(CacheVersion.objects.filter(name__in=labels).values_list('name', 'version'))
+    for label in labels:
+        if label not in versions:
+            # Seeded with the clock so a recreated counter never repeats an old version.
+            versions[label] = CacheVersion.objects.get_or_create(name=label, defaults={'version': time.time_ns()})[0].version
+    return [versions[label] for label in labels]
+
+
+class CachedListMixin:
+    """
+    Caches `list` responses keyed on the viewset, the caller's role, the query string
+    and the version of every model in `cache_models`. Each entry carries an ETag so
+    clients revalidating with If-None-Match get a 304 without a body.
+    """
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = {
+                'data': response.data,
+                # A hash of the body, so every worker hands out the same ETag for the same content.
+                'etag': '"%s"' % hashlib.md5(JSONRenderer().render(response.data)).hexdigest(),
+            }
+            cache.set(key, entry, settings.API_CACHE_TTL)
+
+        if entry['etag'] in request.headers.get('If-None-Match', ''):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get_list_cache_key(self, request):
+        versions = cache_versions(self.cache_models)
+        role = getattr(request.user, 'role', None)
+        params = sorted(request.query_params.lists())
+        raw = f"{request.get_host()}|{role}|{versions}|{params}"
+        return f"api-cache:{self.__class__.__name__}:{hashlib.md5(raw.encode()).hexdigest()}"
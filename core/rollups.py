@@ -0,0 +1,225 @@
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (
+    Count, DateTimeField, DecimalField, F, IntegerField, Max, OuterRef, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .analytics import record_sales
+from .ledger import record_cash_movements
+from .models import LOW_STOCK_THRESHOLD, Customer, Order, OrderStatusRollup, Product, ReorderSuggestion, User
+from .response_cache import bump_cache_version
+
+DASHBOARD_STATUSES = [Order.Status.SETTLED, Order.Status.PENDING_APPROVAL]
+
+LOW_STOCK_CACHE_KEY = 'dashboard:low_stock'
+REORDER_CACHE_KEY = 'dashboard:reorder'
+
+# Orders that count towards a customer's lifetime value
+PURCHASE_STATES = frozenset([Order.Status.DELIVERED, Order.Status.SETTLED])
+# Customer columns maintained from those orders; edits to a customer leave them alone.
+CUSTOMER_TOTAL_FIELDS = ('total_purchases', 'order_count', 'last_order_date')
+
+# What the rollups need to know about an order before/after a change. lines_changed is
+# set on the after state of an edit that replaced the lines, so the edit is a change even
+# when it keeps the total; status transitions leave it False.
+OrderState = namedtuple('OrderState', ['order_id', 'created_by_id', 'customer_id', 'status', 'total_amount', 'created_at', 'lines_changed'])
+
+
+def order_state(order, lines_changed=False):
+    return OrderState(
+        order.pk, order.created_by_id, order.customer_id, order.status, order.total_amount, order.created_at, lines_changed,
+    )
+
+
+def order_changed(before, after):
+    """
+    Keep the rollups in step with an order write. `before`/`after` are OrderState
+    tuples, or None when the order is being created/deleted. Call inside the
+    transaction that writes the order, after the write.
+    """
+    orders_changed([(before, after)])
+
+
+def orders_changed(changes):
+    """
+    order_changed for a list of (before, after) pairs. Changes are summed per customer,
+    rep and (rep, status) bucket first, so moving many orders at once costs a few
+    queries per customer and rep rather than per order.
+    """
+    changes = [(before, after) for before, after in changes if before != after]
+    if not changes:
+        return
+
+    _update_customer_totals(changes)
+    record_cash_movements(changes)
+    record_sales(changes)
+
+    buckets = defaultdict(lambda: [0, Decimal('0.00')])
+    for before, after in changes:
+        if before is not None:
+            bucket = buckets[(before.created_by_id, before.status)]
+            bucket[0] -= 1
+            bucket[1] -= before.total_amount
+        if after is not None:
+            bucket = buckets[(after.created_by_id, after.status)]
+            bucket[0] += 1
+            bucket[1] += after.total_amount
+
+    for (user_id, status), (count, amount) in sorted(buckets.items()):
+        if not count and not amount:
+            continue
+        OrderStatusRollup.objects.get_or_create(user_id=user_id, status=status)
+        OrderStatusRollup.objects.filter(user_id=user_id, status=status).update(
+            order_count=F('order_count') + count,
+            total_amount=F('total_amount') + amount,
+        )
+
+    user_ids = {user_id for user_id, _ in buckets}
+    transaction.on_commit(lambda: cache.delete_many([_stats_key(None)] + [_stats_key(u) for u in user_ids]))
+
+
+def _purchase(state):
+    if state is not None and state.customer_id and state.status in PURCHASE_STATES:
+        return state
+    return None
+
+
+def _update_customer_totals(changes):
+    # customer_id -> [amount, count, a purchase was removed, latest purchase added]
+    totals = defaultdict(lambda: [Decimal('0.00'), 0, False, None])
+    for before, after in changes:
+        before, after = _purchase(before), _purchase(after)
+        if before == after:
+            continue
+        if before and after and before.customer_id == after.customer_id:
+            # Still a purchase by the same customer; only the amount moved.
+            totals[after.customer_id][0] += after.total_amount - before.total_amount
+            continue
+        if before:
+            total = totals[before.customer_id]
+            total[0] -= before.total_amount
+            total[1] -= 1
+            total[2] = True
+        if after:
+            total = totals[after.customer_id]
+            total[0] += after.total_amount
+            total[1] += 1
+            total[3] = max(filter(None, [total[3], after.created_at]))
+
+    updated = False
+    for customer_id, (amount, count, removed, latest) in sorted(totals.items()):
+        if not amount and not count and not removed and latest is None:
+            continue
+        # updated_at is left alone: sync clients treat it as "edited", and these columns are derived.
+        fields = {'total_purchases': F('total_purchases') + amount}
+        if count:
+            fields['order_count'] = F('order_count') + count
+        if removed:
+            # The dropped order may have been the latest; recount from what is left.
+            fields['last_order_date'] = _last_purchase_date()
+        elif latest is not None:
+            created_at = Value(latest, output_field=DateTimeField())
+            fields['last_order_date'] = Greatest(Coalesce(F('last_order_date'), created_at), created_at)
+        Customer.objects.filter(pk=customer_id).update(**fields)
+        updated = True
+
+    if updated:
+        # Queryset updates skip post_save; the customer list shows these columns.
+        bump_cache_version(Customer)
+
+
+def _last_purchase_date():
+    latest = (
+        Order.objects.filter(customer=OuterRef('pk'), status__in=PURCHASE_STATES)
+        .order_by()
+        .values('customer')
+        .annotate(latest=Max('created_at'))
+        .values('latest')
+    )
+    return Subquery(latest, output_field=DateTimeField())
+
+
+def customer_totals_expressions():
+    """Field -> expression recomputing every lifetime-value column from the Order table."""
+    purchases = Order.objects.filter(customer=OuterRef('pk'), status__in=PURCHASE_STATES).order_by().values('customer')
+    return {
+        'total_purchases': Coalesce(
+            Subquery(purchases.annotate(total=Sum('total_amount')).values('total'), output_field=DecimalField()),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(),
+        ),
+        'order_count': Coalesce(
+            Subquery(purchases.annotate(count=Count('id')).values('count'), output_field=IntegerField()),
+            Value(0),
+        ),
+        'last_order_date': _last_purchase_date(),
+    }
+
+
+def invalidate_low_stock():
+    transaction.on_commit(lambda: cache.delete(LOW_STOCK_CACHE_KEY))
+
+
+def dashboard_stats(user):
+    """Dashboard numbers from the rollup table, cached for DASHBOARD_STATS_TTL seconds."""
+    scope = user.pk if user.role == User.Role.SALES_REP else None
+    key = _stats_key(scope)
+    stats = cache.get(key)
+    if stats is None:
+        rows = OrderStatusRollup.objects.filter(status__in=DASHBOARD_STATUSES)
+        if scope is not None:
+            rows = rows.filter(user_id=scope)
+        totals = {
+            row['status']: row
+            for row in rows.values('status').annotate(count=Sum('order_count'), amount=Sum('total_amount'))
+        }
+        # Cash comes from the ledger balances, the same numbers the user list shows.
+        reps = User.objects.filter(pk=scope) if scope is not None else User.objects.all()
+        stats = {
+            'total_revenue': totals.get(Order.Status.SETTLED, {}).get('amount') or 0,
+            'pending_orders': totals.get(Order.Status.PENDING_APPROVAL, {}).get('count') or 0,
+            'cash_on_hand': reps.aggregate(total=Sum('cash_on_hand'))['total'] or 0,
+        }
+        cache.set(key, stats, settings.DASHBOARD_STATS_TTL)
+
+    low_stock_count = cache.get(LOW_STOCK_CACHE_KEY)
+    if low_stock_count is None:
+        low_stock_count = Product.objects.filter(stock_quantity__lt=LOW_STOCK_THRESHOLD).count()
+        cache.set(LOW_STOCK_CACHE_KEY, low_stock_count, settings.DASHBOARD_STATS_TTL)
+
+    # Refreshed by the nightly rebuild_reorder_suggestions, which clears the key.
+    reorder_count = cache.get(REORDER_CACHE_KEY)
+    if reorder_count is None:
+        reorder_count = ReorderSuggestion.objects.filter(needs_reorder=True).count()
+        cache.set(REORDER_CACHE_KEY, reorder_count, settings.DASHBOARD_STATS_TTL)
+
+    return dict(stats, low_stock_items=low_stock_count, reorder_items=reorder_count)
+
+
+def rebuild_status_rollups():
+    """Recompute OrderStatusRollup from the Order table. Returns the number of rows written."""
+    with transaction.atomic():
+        stale_users = set(OrderStatusRollup.objects.values_list('user_id', flat=True))
+        OrderStatusRollup.objects.all().delete()
+        rows = OrderStatusRollup.objects.bulk_create([
+            OrderStatusRollup(
+                user_id=row['created_by'],
+                status=row['status'],
+                order_count=row['count'],
+                total_amount=row['amount'] or Decimal('0.00'),
+            )
+            for row in Order.objects.order_by().values('created_by', 'status')
+            .annotate(count=Count('id'), amount=Sum('total_amount'))
+        ])
+    user_ids = stale_users | {row.user_id for row in rows}
+    cache.delete_many([_stats_key(None), LOW_STOCK_CACHE_KEY] + [_stats_key(u) for u in user_ids])
+    return len(rows)
+
+
+def _stats_key(user_id):
+    return f"dashboard:user:{user_id}" if user_id is not None else 'dashboard:global'
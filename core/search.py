@@ -0,0 +1,206 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+SEARCH_RANK = 'search_rank'
+FTS_TABLE = 'core_product_fts'
+
+# Column weights, in index column order: a SKU hit outranks a name hit, which outranks
+# category and description.
+SQLITE_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_fts_available = {}
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_product_fts USING fts5(
+        sku, name, category, description,
+        tokenize = "unicode61 remove_diacritics 2",
+        prefix = '2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER core_product_fts_insert AFTER INSERT ON core_product BEGIN
+        INSERT INTO core_product_fts (rowid, sku, name, category, description)
+        VALUES (new.id, new.sku, new.name, new.category, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_product_fts_update AFTER UPDATE OF sku, name, category, description ON core_product BEGIN
+        UPDATE core_product_fts
+        SET sku = new.sku, name = new.name, category = new.category, description = new.description
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_product_fts_delete AFTER DELETE ON core_product BEGIN
+        DELETE FROM core_product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    INSERT INTO core_product_fts (rowid, sku, name, category, description)
+    SELECT id, sku, name, category, description FROM core_product
+    """,
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS core_product_fts_insert",
+    "DROP TRIGGER IF EXISTS core_product_fts_update",
+    "DROP TRIGGER IF EXISTS core_product_fts_delete",
+    "DROP TABLE IF EXISTS core_product_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE core_product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', regexp_replace(sku, '[^[:alnum:]]+', ' ', 'g')), 'A')
+        || setweight(to_tsvector('simple', name), 'B')
+        || setweight(to_tsvector('simple', category), 'C')
+        || setweight(to_tsvector('simple', description), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX core_product_search_vector_idx ON core_product USING gin (search_vector)",
+    "CREATE INDEX core_product_sku_trgm_idx ON core_product USING gin (sku gin_trgm_ops)",
+    "CREATE INDEX core_product_name_trgm_idx ON core_product USING gin (name gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS core_product_name_trgm_idx",
+    "DROP INDEX IF EXISTS core_product_sku_trgm_idx",
+    "DROP INDEX IF EXISTS core_product_search_vector_idx",
+    "ALTER TABLE core_product DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _sqlite_has_fts5(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.fts5_probe")
+            return True
+        except Exception:
+            return False
+
+
+def install_search_index(connection):
+    """Create the product search index on `connection` (and index existing rows). Returns False if unsupported."""
+    if connection.vendor == 'sqlite' and _sqlite_has_fts5(connection):
+        statements = SQLITE_FORWARD
+    elif connection.vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    else:
+        return False
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    _fts_available.pop(connection.alias, None)
+    return True
+
+
+def drop_search_index(connection):
+    statements = {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    _fts_available.pop(connection.alias, None)
+
+
+def search_tokens(query):
+    """Lower-cased word tokens of `query`; anything else (quotes, operators, dashes) is dropped."""
+    return [token.lower() for token in _TOKEN_RE.findall(query or '')]
+
+
+def has_search_index(alias):
+    """Whether this database has the product search index (see install_search_index)."""
+    if alias not in _fts_available:
+        connection = connections[alias]
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                columns = connection.introspection.get_table_description(cursor, 'core_product')
+            _fts_available[alias] = any(column.name == 'search_vector' for column in columns)
+        elif connection.vendor == 'sqlite':
+            # Table rebuilds during SQLite migrations drop triggers; without them the index goes stale.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM sqlite_master WHERE (type = 'table' AND name = %s) "
+                    "OR (type = 'trigger' AND tbl_name = 'core_product' AND name LIKE %s)",
+                    (FTS_TABLE, f'{FTS_TABLE}_%'),
+                )
+                _fts_available[alias] = cursor.fetchone()[0] == 4
+        else:
+            _fts_available[alias] = False
+    return _fts_available[alias]
+
+
+def _sqlite_search(queryset, tokens):
+    # Every token is a prefix match, so "brk 10" finds SKU BRK-1002 while it is typed.
+    match = ' '.join(f'"{token}"*' for token in tokens)
+    weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+    rank = RawSQL(
+        f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = core_product.id",
+        (match,),
+        output_field=FloatField(),
+    )
+    hits = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+    return queryset.filter(pk__in=hits).annotate(**{SEARCH_RANK: rank})
+
+
+def _postgres_search(queryset, tokens):
+    tsquery = ' & '.join(f'{token}:*' for token in tokens)
+    text = ' '.join(tokens)
+    # Full-text prefix matches, plus trigram matches so a misspelt name still finds the part.
+    hits = RawSQL(
+        "SELECT id FROM core_product "
+        "WHERE search_vector @@ to_tsquery('simple', %s) OR sku ILIKE %s OR name %% %s",
+        (tsquery, f'{text}%', text),
+    )
+    rank = RawSQL(
+        "(ts_rank(core_product.search_vector, to_tsquery('simple', %s))"
+        " + similarity(core_product.name, %s)"
+        " + CASE WHEN core_product.sku ILIKE %s THEN 1 ELSE 0 END)::double precision",
+        (tsquery, text, f'{text}%'),
+        output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=hits).annotate(**{SEARCH_RANK: rank})
+
+
+def search_products(queryset, query):
+    """
+    Filter a Product queryset down to `query` matches, annotated with `search_rank`
+    (higher is better) and ordered by it. Uses the FTS5 table on SQLite and the
+    tsvector/trigram indexes on Postgres; returns None if this database has no index.
+    """
+    tokens = search_tokens(query)
+    if not tokens or not has_search_index(queryset.db):
+        return None
+    if connections[queryset.db].vendor == 'postgresql':
+        queryset = _postgres_search(queryset, tokens)
+    else:
+        queryset = _sqlite_search(queryset, tokens)
+    return queryset.order_by(f'-{SEARCH_RANK}', 'sku')
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    ?search= backed by the product search index, ranked best match first. Falls back
+    to SearchFilter's icontains lookups over `search_fields` when there is no index.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        ranked = search_products(queryset, ' '.join(terms))
+        if ranked is None:
+            return super().filter_queryset(request, queryset, view)
+        return ranked
@@ -1,7 +1,16 @@
 from rest_framework import serializers
-from .models import User, Product, Order, OrderItem, Customer, Invoice
+from .models import User, Product, Order, OrderItem, Customer, Invoice, InventoryMovement, ReorderSuggestion
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
 from decimal import Decimal
+from collections import defaultdict
+import datetime
+from .analytics import DIMENSIONS, PERIODS
+from .profitability import GROUPINGS, SORTS
+from .rollups import order_changed, order_state
+from .stock import HOLDING_STATES, LOCKED_STATES, InsufficientStock, apply_stock_deltas, check_stock, line_totals
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=False)
@@ -10,7 +19,7 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email', 'role', 'password', 'cash_on_hand']
         
-    cash_on_hand = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    cash_on_hand = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
 
     def create(self, validated_data):
         password = validated_data.pop('password', None)
@@ -35,7 +44,16 @@ class CustomerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Customer
-        fields = ['id', 'name', 'address', 'phone_number', 'city', 'total_purchases']
+        fields = ['id', 'name', 'address', 'phone_number', 'city', 'total_purchases', 'order_count', 'last_order_date']
+
+class SyncCustomerSerializer(serializers.ModelSerializer):
+    """
+    Customers as sent by /api/sync/. The lifetime-value columns change with orders
+    rather than edits and do not move updated_at, so they are left to /api/customers/.
+    """
+    class Meta:
+        model = Customer
+        fields = ['id', 'name', 'address', 'phone_number', 'city']
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
@@ -53,7 +71,21 @@ class ProductSerializer(serializers.ModelSerializer):
             representation.pop('cost_price', None)
         return representation
 
+class ProductIdField(serializers.PrimaryKeyRelatedField):
+    """
+    Accepts a product id without loading the row. OrderSerializer resolves all of an
+    order's products in a single locked query instead of one lookup per line.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
 class OrderItemSerializer(serializers.ModelSerializer):
+    product = ProductIdField(queryset=Product.objects.all())
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_sku = serializers.CharField(source='product.sku', read_only=True)
 
@@ -61,6 +93,14 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['id', 'product', 'product_name', 'product_sku', 'quantity']
 
+def order_items_prefetch():
+    return Prefetch(
+        'items',
+        queryset=OrderItem.objects.select_related('product')
+        .only('id', 'order', 'quantity', 'product__name', 'product__sku')
+        .order_by('id'),
+    )
+
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
@@ -79,6 +119,21 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ['id', 'customer', 'customer_name', 'customer_email', 'customer_phone', 'customer_address', 'customer_city', 'status', 'total_amount', 'discount_percentage', 'created_by', 'created_by_username', 'created_by_name', 'created_at', 'updated_at', 'items']
         read_only_fields = ['status', 'total_amount']
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Join/prefetch everything the representation reads, restricted to the columns it uses."""
+        return queryset.select_related('customer', 'created_by').only(
+            'id', 'status', 'total_amount', 'discount_percentage', 'created_at', 'updated_at',
+            'customer__name', 'customer__phone_number', 'customer__address', 'customer__city',
+            'created_by__username', 'created_by__first_name', 'created_by__last_name',
+        ).prefetch_related(order_items_prefetch())
+
+    def to_representation(self, instance):
+        # Single orders (create/update/status responses) load their lines in one query too.
+        if 'items' not in getattr(instance, '_prefetched_objects_cache', {}):
+            prefetch_related_objects([instance], order_items_prefetch())
+        return super().to_representation(instance)
+
     def get_created_by_name(self, obj):
         if obj.created_by:
             full_name = f"{obj.created_by.first_name} {obj.created_by.last_name}".strip()
@@ -98,96 +153,273 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        
-        # Calculate total amount and basic validation
-        subtotal = 0
-        
+
         # Atomic transaction to ensure order and items are created together
         with transaction.atomic():
-            order = Order.objects.create(**validated_data)
-            
-            for item_data in items_data:
-                product = item_data['product']
-                quantity = item_data['quantity']
-                
-                # Check Stock
-                if product.stock_quantity < quantity:
-                     raise serializers.ValidationError(f"Insufficient stock for {product.name}. Available: {product.stock_quantity}")
-
-                # Calculate Line Price
-                price = product.selling_price
-                line_total = (price * quantity)
-                subtotal += line_total
+            order = Order(**validated_data)
+            products = _locked_products(item['product'] for item in items_data)
+            required = line_totals((item['product'], item['quantity']) for item in items_data)
 
-                # Deduct Stock if status reserves it (PENDING_APPROVAL or valid active status)
-                if order.status not in [Order.Status.DRAFT, Order.Status.REJECTED]:
-                     product.stock_quantity -= quantity
-                     product.save()
-
-                OrderItem.objects.create(order=order, **item_data)
-            
-            # Apply Global Discount
-            discount_multiplier = 1 - (order.discount_percentage / 100)
-            order.total_amount = subtotal * discount_multiplier
+            # Saved first so the stock movements can point at it; a shortage rolls it back.
+            order.total_amount = _order_total(order, products, items_data)
             order.save()
-            
+
+            try:
+                # Deduct Stock if status reserves it (PENDING_APPROVAL or valid active status)
+                if order.status in HOLDING_STATES:
+                    locked = required if order.status in LOCKED_STATES else None
+                    apply_stock_deltas(
+                        {pid: -qty for pid, qty in required.items()}, locked=locked,
+                        order=order, user=_request_user(self.context),
+                    )
+                else:
+                    check_stock(required, products)
+            except InsufficientStock as exc:
+                raise serializers.ValidationError(exc.messages)
+
+            order_changed(None, order_state(order))
+
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product_id=item['product'], quantity=item['quantity'])
+                for item in items_data
+            ])
+
         return order
 
     def update(self, instance, validated_data):
         items_data = validated_data.pop('items', None)
-        
+
         with transaction.atomic():
+            # Lock and re-read the order so a concurrent edit or status change is not overwritten.
+            instance.refresh_from_db(from_queryset=Order.objects.select_for_update())
+            before = order_state(instance)
             # Update Order fields
             instance = super().update(instance, validated_data)
-            
+
             # Update Items if provided
             if items_data is not None:
-                # Basic strategy: Delete all existing and recreate (simplest for MVP)
-                # Ideally, we would diff and update/create/delete
-                
-                # Check status: if reserving stock, we need to handle stock reversal/re-deduction
-                # But typically edits are allowed in DRAFT, where stock isn't deducted.
-                # If editing in PENDING/APPROVED (Admin), we must handle stock.
-                
-                # 1. Restore Stock for removed items if they were reserved
-                is_reserved = instance.status not in [Order.Status.DRAFT, Order.Status.REJECTED]
-                
-                if is_reserved:
-                    for old_item in instance.items.all():
-                        old_item.product.stock_quantity += old_item.quantity
-                        old_item.product.save()
-
-                # 2. Delete old items
-                instance.items.all().delete()
-                
-                # 3. Create new items
-                subtotal = 0
-                for item_data in items_data:
-                    product = item_data['product']
-                    quantity = item_data['quantity']
-                    
-                    if product.stock_quantity < quantity:
-                         raise serializers.ValidationError(f"Insufficient stock for {product.name}. Available: {product.stock_quantity}")
-
-                    price = product.selling_price
-                    
-                    line_total = (price * quantity)
-                    subtotal += line_total
-                    
+                # Stock is only held for orders outside DRAFT/REJECTED; edits there must
+                # release the old lines and reserve the new ones.
+                is_reserved = instance.status in HOLDING_STATES
+
+                existing = list(instance.items.only('id', 'order', 'product', 'quantity').order_by('id'))
+                # Lock the old lines' products too, all in one SKU-ordered pass.
+                products = _locked_products(
+                    [item['product'] for item in items_data] + [line.product_id for line in existing]
+                )
+                held = line_totals((line.product_id, line.quantity) for line in existing)
+                required = line_totals((item['product'], item['quantity']) for item in items_data)
+                to_create, to_update, to_delete = _diff_lines(instance, existing, items_data)
+
+                try:
                     if is_reserved:
-                         product.stock_quantity -= quantity
-                         product.save()
+                        deltas = {
+                            pid: held.get(pid, 0) - required.get(pid, 0)
+                            for pid in set(held) | set(required)
+                        }
+                        locked = None
+                        if instance.status in LOCKED_STATES:
+                            locked = {pid: -change for pid, change in deltas.items()}
+                        apply_stock_deltas(deltas, locked=locked, order=instance, user=_request_user(self.context))
+                    else:
+                        check_stock(required, products)
+                except InsufficientStock as exc:
+                    raise serializers.ValidationError(exc.messages)
+
+                if to_delete:
+                    OrderItem.objects.filter(pk__in=to_delete).delete()
+                if to_update:
+                    OrderItem.objects.bulk_update(to_update, ['quantity'])
+                if to_create:
+                    OrderItem.objects.bulk_create(to_create)
 
-                    OrderItem.objects.create(order=instance, **item_data)
-                
                 # Recalculate Total with updated discount (if instance changed it) or existing one
-                discount_multiplier = 1 - (instance.discount_percentage / 100)
-                instance.total_amount = subtotal * discount_multiplier
-                instance.save()
+                instance.total_amount = _order_total(instance, products, items_data)
+                instance.save(update_fields=['total_amount', 'updated_at'])
+
+            order_changed(before, order_state(instance, lines_changed=items_data is not None))
 
         return instance
 
+
+def _request_user(context):
+    request = context.get('request')
+    return request.user if request is not None and request.user.is_authenticated else None
+
+
+def _locked_products(product_ids):
+    """Fetch (and row-lock) every product an order references in one query."""
+    product_ids = set(product_ids)
+    products = {
+        product.pk: product
+        for product in Product.objects.select_for_update()
+        .filter(pk__in=product_ids)
+        .only('id', 'sku', 'name', 'stock_quantity', 'selling_price')
+        .order_by('sku')
+    }
+    missing = product_ids - set(products)
+    if missing:
+        raise serializers.ValidationError({
+            'items': [f'Invalid pk "{pk}" - object does not exist.' for pk in sorted(missing)]
+        })
+    return products
+
+
+def _order_total(order, products, items_data):
+    subtotal = sum(
+        (products[item['product']].selling_price * item['quantity'] for item in items_data),
+        Decimal('0.00'),
+    )
+    # Apply Global Discount
+    discount_multiplier = 1 - (order.discount_percentage / 100)
+    return subtotal * discount_multiplier
+
+
+def _diff_lines(order, existing, items_data):
+    """
+    Match submitted lines to existing ones by product (in order) so unchanged lines are
+    left alone. Returns (new OrderItems, changed OrderItems, ids of removed lines).
+    """
+    by_product = defaultdict(list)
+    for line in existing:
+        by_product[line.product_id].append(line)
+
+    to_create, to_update = [], []
+    for item in items_data:
+        matches = by_product.get(item['product'])
+        if matches:
+            line = matches.pop(0)
+            if line.quantity != item['quantity']:
+                line.quantity = item['quantity']
+                to_update.append(line)
+        else:
+            to_create.append(OrderItem(order=order, product_id=item['product'], quantity=item['quantity']))
+
+    to_delete = [line.pk for lines in by_product.values() for line in lines]
+    return to_create, to_update, to_delete
+
+
 class InvoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Invoice
-        fields = ['id', 'invoice_number', 'created_at', 'invoice_data']
+        fields = ['id', 'invoice_number', 'created_at', 'invoice_data', 'render_status']
+
+
+class InventoryMovementSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True, default=None)
+
+    class Meta:
+        model = InventoryMovement
+        fields = ['id', 'kind', 'quantity', 'order', 'username', 'reference', 'created_at']
+
+
+
+class ReorderSuggestionSerializer(serializers.ModelSerializer):
+    sku = serializers.CharField(source='product.sku', read_only=True)
+    name = serializers.CharField(source='product.name', read_only=True)
+    category = serializers.CharField(source='product.category', read_only=True)
+
+    class Meta:
+        model = ReorderSuggestion
+        fields = [
+            'product', 'sku', 'name', 'category', 'available', 'units_sold', 'daily_velocity',
+            'days_of_cover', 'reorder_point', 'suggested_quantity', 'needs_reorder', 'computed_at',
+        ]
+
+class StockAdjustmentLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(required=False)
+    sku = serializers.CharField(required=False)
+    quantity = serializers.IntegerField()
+
+    def validate(self, attrs):
+        if ('product' in attrs) == ('sku' in attrs):
+            raise serializers.ValidationError("Give either product or sku")
+        return attrs
+
+
+class StockAdjustmentSerializer(serializers.Serializer):
+    """
+    A batch of stock movements: {"mode": "delta"|"count", "kind": "RECEIPT"|"ADJUSTMENT",
+    "reference": "...", "lines": [{"sku": "BRK-1002", "quantity": 40}, ...]}.
+    validated_data['quantities'] is {product_id: quantity}.
+    """
+    mode = serializers.ChoiceField(choices=['delta', 'count'], default='delta')
+    kind = serializers.ChoiceField(
+        choices=[InventoryMovement.Kind.RECEIPT, InventoryMovement.Kind.ADJUSTMENT],
+        default=InventoryMovement.Kind.ADJUSTMENT,
+    )
+    reference = serializers.CharField(max_length=100, allow_blank=True, default='')
+    lines = StockAdjustmentLineSerializer(many=True, allow_empty=False, max_length=settings.STOCK_ADJUSTMENT_MAX_LINES)
+
+    def validate(self, attrs):
+        lines = attrs['lines']
+        counted = attrs['mode'] == 'count'
+        skus = {line['sku'] for line in lines if 'sku' in line}
+        ids = {line['product'] for line in lines if 'product' in line}
+        by_sku = dict(Product.objects.filter(sku__in=skus).values_list('sku', 'id'))
+        known_ids = set(Product.objects.filter(pk__in=ids).values_list('id', flat=True))
+
+        quantities = defaultdict(int)
+        errors = {}
+        for index, line in enumerate(lines):
+            pid = by_sku.get(line['sku']) if 'sku' in line else line['product']
+            if pid is None or ('product' in line and pid not in known_ids):
+                errors[index] = "Unknown product"
+            elif counted and line['quantity'] < 0:
+                errors[index] = "A counted quantity cannot be negative"
+            elif counted and pid in quantities:
+                errors[index] = "Product is counted twice"
+            elif not counted and attrs['kind'] == InventoryMovement.Kind.RECEIPT and line['quantity'] <= 0:
+                errors[index] = "A receipt must add stock"
+            else:
+                quantities[pid] += line['quantity']
+        if errors:
+            raise serializers.ValidationError({'lines': errors})
+        attrs['quantities'] = dict(quantities)
+        return attrs
+
+
+class SalesAnalyticsQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of /api/analytics/sales/: ?interval=day|week|month
+    &group_by=sales_rep,city,category&date_from=&date_to=&city=&category=&sales_rep=.
+    The range defaults to the last 30 days.
+    """
+    interval = serializers.ChoiceField(choices=list(PERIODS), default='day')
+    group_by = serializers.CharField(required=False, allow_blank=True, default='')
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    city = serializers.ChoiceField(choices=Customer.City.choices, required=False)
+    category = serializers.ChoiceField(choices=Product.Category.choices, required=False)
+    sales_rep = serializers.IntegerField(required=False)
+
+    def validate_group_by(self, value):
+        dimensions = [dimension.strip() for dimension in value.split(',') if dimension.strip()]
+        unknown = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown dimension(s): {', '.join(unknown)}; use {', '.join(DIMENSIONS)}")
+        return dimensions
+
+    def validate(self, attrs):
+        attrs.setdefault('date_to', timezone.localdate())
+        attrs.setdefault('date_from', attrs['date_to'] - datetime.timedelta(days=30))
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to")
+        return attrs
+
+
+class ProfitabilityQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of /api/analytics/profitability/: ?group_by=order|product|category|sales_rep
+    &date_from=&date_to=&sort=-margin&limit=100. Without dates every sales order is included.
+    """
+    group_by = serializers.ChoiceField(choices=GROUPINGS, default='product')
+    date_from = serializers.DateField(default=None)
+    date_to = serializers.DateField(default=None)
+    sort = serializers.ChoiceField(choices=SORTS, default='-margin')
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+    def validate(self, attrs):
+        if attrs['date_from'] and attrs['date_to'] and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to")
+        return attrs
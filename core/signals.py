@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .analytics import record_city_change
+from .models import Customer, InventoryMovement, Product, Tombstone
+from .response_cache import bump_cache_version
+from .stock import record_stock_change
+from .suggest import suggest_index
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Customer)
+def invalidate_cached_lists(sender, **kwargs):
+    bump_cache_version(sender)
+
+
+@receiver(pre_save, sender=Customer)
+def remember_saved_city(sender, instance, raw=False, update_fields=None, **kwargs):
+    if instance.pk and not raw and (update_fields is None or 'city' in update_fields):
+        instance._saved_city = Customer.objects.filter(pk=instance.pk).values_list('city', flat=True).first()
+
+
+@receiver(post_save, sender=Customer)
+def move_city_sales(sender, instance, created, raw=False, **kwargs):
+    # Sales facts are bucketed by the customer's current city.
+    if not created and not raw and hasattr(instance, '_saved_city'):
+        record_city_change(instance.pk, instance.__dict__.pop('_saved_city'), instance.city)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Customer)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(kind=sender._meta.model_name, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def record_opening_stock(sender, instance, created, raw=False, **kwargs):
+    # Later changes go through the stock engine or ProductViewSet/ProductAdmin, which log their own movements.
+    if created and not raw:
+        record_stock_change(instance, instance.stock_quantity, InventoryMovement.Kind.RECEIPT, reference="opening stock")
+
+
+@receiver(post_save, sender=Product)
+def update_suggest_index(sender, instance, **kwargs):
+    # Other processes catch up through SuggestIndex.refresh; this keeps the local one exact.
+    if suggest_index.loaded:
+        row = (instance.pk, instance.sku, instance.name, instance.category)
+        transaction.on_commit(lambda: suggest_index.upsert(*row))
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    if suggest_index.loaded:
+        product_id = instance.pk
+        transaction.on_commit(lambda: suggest_index.remove(product_id))
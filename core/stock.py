@@ -0,0 +1,271 @@
+import logging
+import time
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from .events import publish_stock_levels
+from .models import InventoryMovement, Order, OrderItem, Product, StockSnapshot
+from .response_cache import bump_cache_version
+from .rollups import invalidate_low_stock
+
+logger = logging.getLogger(__name__)
+
+# Stock is deducted while an order sits in a HOLDING state and available again in a FREE state.
+HOLDING_STATES = frozenset([
+    Order.Status.PENDING_APPROVAL,
+    Order.Status.APPROVED,
+    Order.Status.PACKED,
+    Order.Status.OUT_FOR_DELIVERY,
+    Order.Status.DELIVERED,
+    Order.Status.SETTLED,
+])
+FREE_STATES = frozenset([Order.Status.DRAFT, Order.Status.REJECTED])
+
+# Orders awaiting fulfilment; their quantities are reported as Product.locked_stock.
+LOCKED_STATES = frozenset([Order.Status.PENDING_APPROVAL, Order.Status.APPROVED])
+
+# Keeps the CASE expression and IN list well below backend parameter limits.
+STOCK_UPDATE_BATCH_SIZE = 500
+
+StockResult = namedtuple('StockResult', ['products', 'elapsed_ms'])
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortages):
+        # shortages: list of dicts with product_id, sku, name, requested, available
+        self.shortages = shortages
+        super().__init__("; ".join(self.messages))
+
+    @property
+    def messages(self):
+        return [
+            f"Insufficient stock for {s['name']}. Available: {s['available']}"
+            for s in self.shortages
+        ]
+
+
+def stock_direction(old_status, new_status):
+    """
+    -1 when the transition deducts stock (FREE -> HOLDING),
+    +1 when it restores stock (HOLDING -> FREE), 0 otherwise.
+    """
+    if old_status in FREE_STATES and new_status in HOLDING_STATES:
+        return -1
+    if old_status in HOLDING_STATES and new_status in FREE_STATES:
+        return 1
+    return 0
+
+
+def locked_direction(old_status, new_status):
+    """+1 when the order starts counting towards locked_stock, -1 when it stops, 0 otherwise."""
+    if old_status not in LOCKED_STATES and new_status in LOCKED_STATES:
+        return 1
+    if old_status in LOCKED_STATES and new_status not in LOCKED_STATES:
+        return -1
+    return 0
+
+
+def line_totals(lines):
+    """Sum (product_id, quantity) pairs into {product_id: quantity}."""
+    totals = defaultdict(int)
+    for product_id, quantity in lines:
+        totals[product_id] += quantity
+    return totals
+
+
+def order_quantities(order):
+    return line_totals(order.items.values_list('product_id', 'quantity'))
+
+
+def apply_stock_deltas(deltas, locked=None, order=None, user=None, kind=None, reference='', movements=None):
+    """
+    Apply {product_id: change} to Product.stock_quantity (and `locked` changes to
+    Product.locked_stock) with one conditional UPDATE per batch. Negative stock changes
+    only apply where enough stock is left; if any product falls short the whole call is
+    rolled back and every short line is reported.
+
+    Every stock change is recorded as an InventoryMovement of `kind`, or for order
+    changes (kind=None) a RESERVATION when stock is taken and a RELEASE when returned.
+    Callers applying several orders at once pass their own per-order `movements` instead.
+    """
+    started = time.perf_counter()
+    deltas = {pid: change for pid, change in deltas.items() if change}
+    locked = {pid: change for pid, change in (locked or {}).items() if change}
+    product_ids = sorted(set(deltas) | set(locked))
+
+    with transaction.atomic():
+        # Read under the lock, before any row is decremented: shortages are reported
+        # against the stock the request was checked against.
+        before = lock_products(product_ids)
+        updated = 0
+        for start in range(0, len(product_ids), STOCK_UPDATE_BATCH_SIZE):
+            batch = product_ids[start:start + STOCK_UPDATE_BATCH_SIZE]
+            required = _case([(pid, -deltas[pid]) for pid in batch if deltas.get(pid, 0) < 0])
+            changes = {}
+            stock_change = [(pid, deltas[pid]) for pid in batch if pid in deltas]
+            if stock_change:
+                changes['stock_quantity'] = F('stock_quantity') + _case(stock_change)
+            locked_change = [(pid, locked[pid]) for pid in batch if pid in locked]
+            if locked_change:
+                # The counter is derived data; clamp rather than fail a transition on drift.
+                changes['locked_stock'] = Greatest(F('locked_stock') + _case(locked_change), Value(0))
+            # auto_now is skipped by queryset updates; sync clients rely on updated_at.
+            changes['updated_at'] = Now()
+            updated += Product.objects.filter(
+                pk__in=batch, stock_quantity__gte=required
+            ).update(**changes)
+
+        if updated != len(product_ids):
+            raise InsufficientStock(_shortages(deltas, before))
+
+        if movements is not None:
+            InventoryMovement.objects.bulk_create(movements, batch_size=STOCK_UPDATE_BATCH_SIZE)
+        elif deltas:
+            InventoryMovement.objects.bulk_create(
+                [
+                    InventoryMovement(
+                        product_id=pid,
+                        kind=kind or (InventoryMovement.Kind.RELEASE if change > 0 else InventoryMovement.Kind.RESERVATION),
+                        quantity=change,
+                        order=order,
+                        user=user,
+                        reference=reference,
+                    )
+                    for pid, change in sorted(deltas.items())
+                ],
+                batch_size=STOCK_UPDATE_BATCH_SIZE,
+            )
+
+        if deltas:
+            invalidate_low_stock()
+        if product_ids:
+            # Queryset updates skip post_save, so cached product lists are invalidated here.
+            bump_cache_version(Product)
+            publish_stock_levels(product_ids)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.debug("Applied stock changes to %d products in %.2fms", len(product_ids), elapsed_ms)
+    return StockResult(products=len(product_ids), elapsed_ms=elapsed_ms)
+
+
+def lock_products(product_ids):
+    """
+    Row-lock products in SKU order. Every writer locks in this order, so concurrent
+    transactions touching the same hot SKUs queue up instead of deadlocking. Locks are
+    held until the surrounding transaction ends; a no-op on SQLite, which has no row locks.
+    Returns the locked rows' id, sku, name and stock_quantity.
+    """
+    if not product_ids:
+        return []
+    return list(
+        Product.objects.select_for_update()
+        .filter(pk__in=list(product_ids))
+        .order_by('sku')
+        .values('id', 'sku', 'name', 'stock_quantity')
+    )
+
+
+def expected_locked_stock():
+    """Subquery computing a product's locked_stock from its open order lines."""
+    locked_lines = (
+        OrderItem.objects.filter(product=OuterRef('pk'), order__status__in=LOCKED_STATES)
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(locked_lines, output_field=IntegerField()), Value(0))
+
+
+def adjust_stock(quantities, counted=False, kind=InventoryMovement.Kind.ADJUSTMENT, user=None, reference=''):
+    """
+    Apply a batch of {product_id: quantity} in one transaction. By default quantities
+    are changes (a receipt, a write-off). With counted=True they are stocktake counts of
+    units on the shelf, i.e. stock_quantity plus locked_stock (open orders not yet
+    picked), and the difference is booked as the adjustment.
+    Returns ({product_id: change}, StockResult).
+    """
+    with transaction.atomic():
+        if counted:
+            on_shelf = (
+                Product.objects.select_for_update()
+                .filter(pk__in=list(quantities))
+                .order_by('sku')
+                .values_list('id', 'stock_quantity', 'locked_stock')
+            )
+            deltas = {pid: quantities[pid] - (stock + locked) for pid, stock, locked in on_shelf}
+        else:
+            deltas = dict(quantities)
+        result = apply_stock_deltas(deltas, kind=kind, user=user, reference=reference)
+    return {pid: change for pid, change in deltas.items() if change}, result
+
+
+def record_stock_change(product, change, kind, user=None, reference=''):
+    """Log a stock_quantity change that was written directly (product create/edit) rather than through apply_stock_deltas."""
+    if change:
+        InventoryMovement.objects.create(product=product, kind=kind, quantity=change, user=user, reference=reference)
+        publish_stock_levels([product.pk])
+
+
+def with_ledger_stock(queryset, upto=None):
+    """
+    Annotate products with `ledger_quantity`: their latest StockSnapshot plus the
+    movements recorded after it. Only movements since the last snapshot are summed,
+    so stock_quantity can be audited without replaying the whole history.
+    """
+    latest = StockSnapshot.objects.filter(product=OuterRef('pk')).order_by('-movement_id')
+    since_snapshot = (
+        InventoryMovement.objects.filter(product=OuterRef('pk'), id__gt=OuterRef('snapshot_movement_id'))
+        .filter(**({'id__lte': upto} if upto is not None else {}))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return queryset.annotate(
+        snapshot_movement_id=Coalesce(Subquery(latest.values('movement_id')[:1]), Value(0)),
+        snapshot_quantity=Coalesce(Subquery(latest.values('quantity')[:1]), Value(0)),
+    ).annotate(
+        ledger_quantity=F('snapshot_quantity') + Coalesce(Subquery(since_snapshot, output_field=IntegerField()), Value(0)),
+    )
+
+
+def _case(pairs):
+    return Case(
+        *[When(pk=pid, then=Value(value)) for pid, value in pairs],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def check_stock(required, products):
+    """
+    Raise InsufficientStock if {product_id: quantity} is more than the already
+    loaded `products` ({product_id: Product}) have on hand. Nothing is written.
+    """
+    rows = [
+        {'id': p.pk, 'sku': p.sku, 'name': p.name, 'stock_quantity': p.stock_quantity}
+        for p in products.values()
+    ]
+    shortages = _shortages({pid: -qty for pid, qty in required.items()}, rows)
+    if shortages:
+        raise InsufficientStock(shortages)
+
+
+def _shortages(deltas, rows):
+    shortages = []
+    for row in sorted(rows, key=lambda r: r['sku']):
+        change = deltas.get(row['id'], 0)
+        available = row['stock_quantity']
+        if change < 0 and available < -change:
+            shortages.append({
+                'product_id': row['id'],
+                'sku': row['sku'],
+                'name': row['name'],
+                'requested': -change,
+                'available': available,
+            })
+    return shortages
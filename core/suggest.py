@@ -0,0 +1,230 @@
+import datetime
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Product, Tombstone
+
+MAX_NAME_CANDIDATES = 2000
+# Typo matching looks up one-edit variants of the query, which only pays off from this length.
+MIN_TYPO_LENGTH = 3
+
+_STRIP_RE = re.compile(r'[\W_]+', re.UNICODE)
+_WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def normalize(text):
+    """Upper-case alphanumerics only, so "brk-10", "BRK 10" and "Brk10" all key as BRK10."""
+    return _STRIP_RE.sub('', text or '').upper()
+
+
+def name_words(name):
+    return {word for word in (normalize(word) for word in _WORD_RE.findall(name or '')) if len(word) > 1}
+
+
+def typo_variants(key, alphabet):
+    """Every string one edit (delete, swap of neighbours, substitute, insert) away from `key`."""
+    splits = [(key[:i], key[i:]) for i in range(len(key) + 1)]
+    variants = {left + right[1:] for left, right in splits if right}
+    variants.update(left + right[1] + right[0] + right[2:] for left, right in splits if len(right) > 1)
+    variants.update(left + char + right[1:] for left, right in splits if right for char in alphabet)
+    variants.update(left + char + right for left, right in splits for char in alphabet)
+    variants.discard(key)
+    return variants
+
+
+def _position(keys, ids, key, product_id):
+    # Entries sharing a key are ordered by id, so both lookups are bisections.
+    return bisect_left(ids, product_id, bisect_left(keys, key), bisect_right(keys, key))
+
+
+def _insert(keys, ids, key, product_id):
+    i = _position(keys, ids, key, product_id)
+    keys.insert(i, key)
+    ids.insert(i, product_id)
+
+
+def _remove(keys, ids, key, product_id):
+    i = _position(keys, ids, key, product_id)
+    if i < len(keys) and keys[i] == key and ids[i] == product_id:
+        del keys[i]
+        del ids[i]
+
+
+def _prefix_range(keys, prefix):
+    return bisect_left(keys, prefix), bisect_left(keys, prefix + '\uffff')
+
+
+class SuggestIndex:
+    """
+    In-process SKU/name autocomplete. Products live in memory as two sorted key lists
+    (normalized SKUs and name words) searched by bisection; a SKU typo is matched by
+    looking up every one-edit variant of the query as a prefix. Queries never touch
+    the database.
+
+    Results rank exact SKU, then SKU prefix, then name-word prefix, then SKU typo hits.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._products = {}
+        self._sku_keys, self._sku_ids = [], array('q')
+        self._word_keys, self._word_ids = [], array('q')
+        self._alphabet = ''
+        self.loaded = False
+        self._watermark = None
+        self._checked_at = 0.0
+
+    def build(self, rows):
+        """Replace the index with `rows` of (id, sku, name, category)."""
+        products = {}
+        sku_pairs, word_pairs = [], []
+        for product_id, sku, name, category in rows:
+            products[product_id] = (sku, name, category)
+            sku_pairs.append((normalize(sku), product_id))
+            word_pairs.extend((word, product_id) for word in name_words(name))
+        sku_pairs.sort()
+        word_pairs.sort()
+
+        with self._lock:
+            self._products = products
+            self._sku_keys = [key for key, _ in sku_pairs]
+            self._sku_ids = array('q', (product_id for _, product_id in sku_pairs))
+            self._word_keys = [key for key, _ in word_pairs]
+            self._word_ids = array('q', (product_id for _, product_id in word_pairs))
+            self._alphabet = ''.join(sorted(set(''.join(self._sku_keys))))
+            self.loaded = True
+
+    def upsert(self, product_id, sku, name, category):
+        with self._lock:
+            entry = (sku, name, category)
+            old = self._products.get(product_id)
+            if old == entry:
+                return
+            if old is not None:
+                self._unindex(product_id, old)
+            self._products[product_id] = entry
+            key = normalize(sku)
+            _insert(self._sku_keys, self._sku_ids, key, product_id)
+            for word in name_words(name):
+                _insert(self._word_keys, self._word_ids, word, product_id)
+            new_chars = set(key).difference(self._alphabet)
+            if new_chars:
+                self._alphabet = ''.join(sorted(new_chars.union(self._alphabet)))
+
+    def remove(self, product_id):
+        with self._lock:
+            old = self._products.pop(product_id, None)
+            if old is not None:
+                self._unindex(product_id, old)
+
+    def _unindex(self, product_id, entry):
+        sku, name, _ = entry
+        _remove(self._sku_keys, self._sku_ids, normalize(sku), product_id)
+        for word in name_words(name):
+            _remove(self._word_keys, self._word_ids, word, product_id)
+
+    def __len__(self):
+        return len(self._products)
+
+    def suggest(self, query, limit=10):
+        """Up to `limit` dicts of {id, sku, name, category, score}, best match first."""
+        key = normalize(query)
+        if not key or limit < 1:
+            return []
+        with self._lock:
+            scores = {}
+            self._match_sku_prefix(key, limit, scores)
+            if len(scores) < limit:
+                self._match_name_words(query, limit, scores)
+            if len(scores) < limit and len(key) >= MIN_TYPO_LENGTH:
+                self._match_sku_typos(key, limit, scores)
+
+            products = self._products
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], products[item[0]][0]))[:limit]
+            return [
+                {'id': product_id, 'sku': products[product_id][0], 'name': products[product_id][1],
+                 'category': products[product_id][2], 'score': score}
+                for product_id, score in ranked
+            ]
+
+    def _match_sku_prefix(self, key, limit, scores):
+        start, end = _prefix_range(self._sku_keys, key)
+        for i in range(start, min(end, start + limit)):
+            scores[self._sku_ids[i]] = 4.0 if self._sku_keys[i] == key else 3.0
+
+    def _match_name_words(self, query, limit, scores):
+        words = [normalize(word) for word in _WORD_RE.findall(query)]
+        words = [word for word in words if word]
+        if not words:
+            return
+        # Walk the narrowest word's range and check the other words against each candidate.
+        ranges = sorted((_prefix_range(self._word_keys, word) for word in words), key=lambda r: r[1] - r[0])
+        start, end = ranges[0]
+        seen = set()
+        for i in range(start, min(end, start + MAX_NAME_CANDIDATES)):
+            product_id = self._word_ids[i]
+            if product_id in seen or product_id in scores:
+                continue
+            seen.add(product_id)
+            if len(words) > 1:
+                candidate_words = name_words(self._products[product_id][1])
+                if not all(any(word.startswith(q) for word in candidate_words) for q in words):
+                    continue
+            scores[product_id] = 2.0
+            if len(scores) >= limit:
+                return
+
+    def _match_sku_typos(self, key, limit, scores):
+        # A SKU whose prefix is one edit away from the query starts with one of the variants.
+        keys = self._sku_keys
+        for variant in typo_variants(key, self._alphabet):
+            i = bisect_left(keys, variant)
+            end = min(len(keys), i + limit)
+            while i < end and keys[i].startswith(variant):
+                scores.setdefault(self._sku_ids[i], 1.0)
+                i += 1
+
+    # Database sync
+
+    def load(self):
+        watermark = self._new_watermark()
+        self.build(Product.objects.values_list('id', 'sku', 'name', 'category').iterator(chunk_size=5000))
+        self._watermark = watermark
+        self._checked_at = time.monotonic()
+
+    def refresh(self):
+        """Apply products saved or deleted since the last load/refresh (e.g. by other processes)."""
+        watermark = self._new_watermark()
+        changed = Product.objects.filter(updated_at__gt=self._watermark).values_list('id', 'sku', 'name', 'category')
+        for row in changed.iterator(chunk_size=5000):
+            self.upsert(*row)
+        deleted = Tombstone.objects.filter(kind=Tombstone.Kind.PRODUCT, deleted_at__gt=self._watermark)
+        for product_id in deleted.values_list('object_id', flat=True):
+            self.remove(product_id)
+        self._watermark = watermark
+        self._checked_at = time.monotonic()
+
+    def _new_watermark(self):
+        # Overlap like the sync endpoint so rows committed late by other transactions are not missed.
+        return timezone.now() - datetime.timedelta(seconds=settings.SYNC_WATERMARK_OVERLAP)
+
+    def ensure_fresh(self):
+        """Load on first use, then catch up at most every SUGGEST_REFRESH_INTERVAL seconds."""
+        if not self.loaded:
+            with self._sync_lock:
+                if not self.loaded:
+                    self.load()
+        elif time.monotonic() - self._checked_at >= settings.SUGGEST_REFRESH_INTERVAL:
+            with self._sync_lock:
+                if time.monotonic() - self._checked_at >= settings.SUGGEST_REFRESH_INTERVAL:
+                    self.refresh()
+
+
+suggest_index = SuggestIndex()
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, OrderViewSet, UserViewSet, CustomerViewSet, DashboardStatsViewSet
+from .views import ProductViewSet, OrderViewSet, UserViewSet, CustomerViewSet, DashboardStatsViewSet, ProfitabilityViewSet, SalesAnalyticsViewSet, SyncViewSet, event_stream
 
 router = DefaultRouter()
 router.register(r'customers', CustomerViewSet)
@@ -8,8 +8,12 @@ router.register(r'users', UserViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'dashboard-stats', DashboardStatsViewSet, basename='dashboard-stats')
+router.register(r'sync', SyncViewSet, basename='sync')
+router.register(r'analytics/sales', SalesAnalyticsViewSet, basename='sales-analytics')
+router.register(r'analytics/profitability', ProfitabilityViewSet, basename='profitability')
 
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('events/', event_stream, name='events'),
 ]
@@ -1,35 +1,46 @@
-from rest_framework import viewsets, permissions, status, filters
+from rest_framework import viewsets, permissions, status, filters, serializers
 from django_filters.rest_framework import DjangoFilterBackend
 import django_filters
 from rest_framework.decorators import action
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.conf import settings
+import datetime
+import time
 from rest_framework.response import Response
 from django.db import transaction
 from django.shortcuts import get_object_or_404
-from .models import User, Product, Order, OrderItem, Customer, Invoice
-from .serializers import ProductSerializer, OrderSerializer, UserSerializer, CustomerSerializer, InvoiceSerializer
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+import json
+from .models import User, Product, Order, OrderItem, Customer, Invoice, Tombstone, InventoryMovement, ReorderSuggestion
+from .serializers import ProductSerializer, OrderSerializer, UserSerializer, CustomerSerializer, InvoiceSerializer, InventoryMovementSerializer, ProfitabilityQuerySerializer, ReorderSuggestionSerializer, SalesAnalyticsQuerySerializer, StockAdjustmentSerializer, SyncCustomerSerializer
+from .analytics import sales_report
+from .events import latest_event_id, stream_events
+from .exports import EXPORT_FORMATS, export_response, requested_format, streaming_response
+from .invoicing import issue_invoice, issue_invoices
+from .profitability import ReportUnavailable, profitability_report
+from .product_import import ImportFileError, ProductImport, read_rows
+from .pagination import (
+    InvalidCursor, MovementPagination, OffsetPagination, OrderPagination, ProductPagination, decode_cursor, encode_cursor,
+    updated_since_page,
+)
+from .response_cache import CachedListMixin
+from .search import ProductSearchFilter, search_products, search_tokens
+from .suggest import suggest_index
+from .workflow import TransitionNotAllowed, bulk_transition, get_transition, next_states, transition_order
+from .rollups import CUSTOMER_TOTAL_FIELDS, dashboard_stats, invalidate_low_stock, order_changed, order_state
+from .stock import LOCKED_STATES, InsufficientStock, adjust_stock, apply_stock_deltas, order_quantities, record_stock_change
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
-    
-    def get_queryset(self):
-        from django.db.models import Sum, Q, Value, DecimalField
-        from django.db.models.functions import Coalesce
-        
-        return Customer.objects.annotate(
-            total_purchases=Coalesce(
-                Sum('orders__total_amount', filter=Q(orders__status__in=['DELIVERED', 'SETTLED'])),
-                Value(0),
-                output_field=DecimalField()
-            )
-        )
+    cache_models = (Customer,)
     serializer_class = CustomerSerializer
     permission_classes = []
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve', 'create']:
+        if self.action in ['list', 'retrieve', 'create', 'export']:
             return [permissions.IsAuthenticated()]
         return [permissions.IsAdminUser()]
     
@@ -37,6 +48,22 @@ class CustomerViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'phone_number', 'address']
     filterset_fields = ['name', 'phone_number', 'city']
 
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # Re-read the lifetime-value columns under a row lock so an edit never writes back stale totals.
+            current = Customer.objects.select_for_update().only(*CUSTOMER_TOTAL_FIELDS).get(pk=serializer.instance.pk)
+            for field in CUSTOMER_TOTAL_FIELDS:
+                setattr(serializer.instance, field, getattr(current, field))
+            serializer.save()
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Stream all customers matching the list filters: ?fmt=csv|ndjson&city=..."""
+        fmt = requested_format(request)
+        if fmt not in EXPORT_FORMATS:
+            return Response({"error": f"fmt must be one of {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(request, 'customers', self.filter_queryset(self.get_queryset()), fmt)
+
 
 
 class UserFilter(django_filters.FilterSet):
@@ -62,21 +89,16 @@ class UserViewSet(viewsets.ModelViewSet):
     filterset_class = UserFilter
     search_fields = ['username', 'email', 'first_name', 'last_name']
 
-    def get_queryset(self):
-        from django.db.models import Sum, Q, Value, DecimalField
-        from django.db.models.functions import Coalesce
-        
-        return User.objects.annotate(
-            cash_on_hand=Coalesce(
-                Sum('orders__total_amount', filter=Q(orders__status='DELIVERED')),
-                Value(0),
-                output_field=DecimalField()
-            )
-        )
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # Re-read the balance under a row lock so an edit never writes back a stale cash_on_hand.
+            current = User.objects.select_for_update().only('cash_on_hand').get(pk=serializer.instance.pk)
+            serializer.instance.cash_on_hand = current.cash_on_hand
+            serializer.save()
 
 
 
-from django.db.models import Sum, Q, Value
+from django.db.models import F, ProtectedError, Sum, Q, Value
 from django.db.models.functions import Coalesce
 
 
@@ -95,50 +117,188 @@ class ProductFilter(django_filters.FilterSet):
             return queryset.filter(locked_stock=0)
         return queryset
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedListMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
+    cache_models = (Product,)
     serializer_class = ProductSerializer
     # Permission: Authenticated users can view. Only Admin/Warehouse can edit (simplified for MVP)
     # For now, let's allow read for all authenticated, write for Admin only ideally
     
-    def get_queryset(self):
-        return Product.objects.annotate(
-            locked_stock=Coalesce(
-                Sum('orderitem__quantity', 
-                    filter=Q(orderitem__order__status__in=[Order.Status.PENDING_APPROVAL, Order.Status.APPROVED])
-                ), 
-                0
-            )
-        )
-
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'autocomplete', 'suggest', 'stock_adjustments', 'reorder_suggestions']:
             return [permissions.IsAuthenticated()]
         return [permissions.IsAdminUser()] # Or custom permission
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'sku', 'description']
     filterset_class = ProductFilter
+    pagination_class = ProductPagination
+    autocomplete_limit = 10
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Top prefix matches for the parts-lookup box: ?q=brk%2010&limit=10.
+        Returns a flat list of {id, sku, name, category}, best match first.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', self.autocomplete_limit)), 50)
+        except ValueError:
+            limit = self.autocomplete_limit
+        query = request.query_params.get('q', '')
+        queryset = Product.objects.all()
+        ranked = search_products(queryset, query)
+        if ranked is None:
+            tokens = search_tokens(query)
+            if not tokens:
+                return Response([])
+            ranked = queryset.filter(Q(sku__istartswith=query) | Q(name__icontains=query)).order_by('sku')
+        return Response(list(ranked.values('id', 'sku', 'name', 'category')[:max(limit, 1)]))
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_products(self, request):
+        """
+        Upsert products by SKU from an uploaded supplier sheet (multipart field `file`,
+        .csv or .xlsx; columns sku, name, description, cost_price, selling_price, category).
+        Pass dry_run=true to get the per-row diff without writing anything.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the price list as the 'file' field"}, status=status.HTTP_400_BAD_REQUEST)
+        dry_run = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true', 'yes')
+        try:
+            report = ProductImport(dry_run=dry_run).run(read_rows(upload, upload.name))
+        except ImportFileError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        Typo-tolerant SKU/name suggestions served from the in-process index, without a
+        database query: ?q=bkr-10&limit=10.
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', self.autocomplete_limit)), 50)
+        except ValueError:
+            limit = self.autocomplete_limit
+        suggest_index.ensure_fresh()
+        started = time.perf_counter()
+        results = suggest_index.suggest(request.query_params.get('q', ''), limit)
+        response = Response(results)
+        response['Server-Timing'] = f"suggest;dur={(time.perf_counter() - started) * 1000:.3f}"
+        return response
+
+    def perform_create(self, serializer):
+        serializer.save()
+        invalidate_low_stock()
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # Re-read the counters under a row lock so an edit never writes back stale stock.
+            current = Product.objects.select_for_update().only('stock_quantity', 'locked_stock').get(pk=serializer.instance.pk)
+            serializer.instance.stock_quantity = current.stock_quantity
+            serializer.instance.locked_stock = current.locked_stock
+            product = serializer.save()
+            record_stock_change(
+                product, product.stock_quantity - current.stock_quantity,
+                InventoryMovement.Kind.ADJUSTMENT, self.request.user, "product edit",
+            )
+        invalidate_low_stock()
+
+    def perform_destroy(self, instance):
+        try:
+            instance.delete()
+        except ProtectedError:
+            raise serializers.ValidationError(
+                {"error": "Products with order lines or stock movements cannot be deleted."}
+            )
+        invalidate_low_stock()
+
+    @action(detail=False, methods=['post'], url_path='stock-adjustments')
+    def stock_adjustments(self, request):
+        """
+        Apply a batch of receipts/adjustments (mode=delta) or stocktake counts (mode=count)
+        in one transaction; see StockAdjustmentSerializer for the body. Nothing is applied
+        if any line is invalid or would take a product below zero.
+        """
+        if request.user.role not in (User.Role.ADMIN, User.Role.WAREHOUSE):
+            return Response({"error": "Only Admin or Warehouse can adjust stock"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = StockAdjustmentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        counted = data['mode'] == 'count'
+        try:
+            changes, result = adjust_stock(
+                data['quantities'],
+                counted=counted,
+                kind=InventoryMovement.Kind.ADJUSTMENT if counted else data['kind'],
+                user=request.user,
+                reference=data['reference'],
+            )
+        except InsufficientStock as exc:
+            raise serializers.ValidationError(exc.messages)
+        response = Response({
+            'products': result.products,
+            'changes': [{'product': pid, 'change': change} for pid, change in sorted(changes.items())],
+        })
+        response['Server-Timing'] = f"stock;dur={result.elapsed_ms:.2f}"
+        return response
+
+    @action(detail=False, methods=['get'], url_path='reorder-suggestions')
+    def reorder_suggestions(self, request):
+        """
+        Last night's reorder suggestions, fewest days of cover first. Only products to
+        reorder unless ?all=true; ?category= narrows to one category.
+        """
+        if request.user.role not in (User.Role.ADMIN, User.Role.WAREHOUSE):
+            return Response({"error": "Only Admin or Warehouse can view reorder suggestions"}, status=status.HTTP_403_FORBIDDEN)
+        suggestions = ReorderSuggestion.objects.select_related('product')
+        if request.query_params.get('all', '').lower() not in ('1', 'true', 'yes'):
+            suggestions = suggestions.filter(needs_reorder=True)
+        category = request.query_params.get('category')
+        if category:
+            suggestions = suggestions.filter(product__category=category)
+        # Products without demand have no days of cover; they sort last.
+        suggestions = suggestions.order_by(F('days_of_cover').asc(nulls_last=True), 'product')
+        paginator = OffsetPagination()
+        page = paginator.paginate_queryset(suggestions, request, view=self)
+        return paginator.get_paginated_response(ReorderSuggestionSerializer(page, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def movements(self, request, pk=None):
+        """The product's stock movements, newest first."""
+        product = self.get_object()
+        paginator = MovementPagination()
+        page = paginator.paginate_queryset(product.movements.select_related('user'), request, view=self)
+        return paginator.get_paginated_response(InventoryMovementSerializer(page, many=True).data)
 
 class OrderFilter(django_filters.FilterSet):
     created_at = django_filters.DateFromToRangeFilter()
-    status = django_filters.CharFilter(lookup_expr='iexact')
+    status = django_filters.CharFilter(method='filter_status')
+    city = django_filters.CharFilter(field_name='customer__city', lookup_expr='iexact')
 
     class Meta:
         model = Order
         fields = ['customer', 'status', 'created_by', 'created_at']
 
+    def filter_status(self, queryset, name, value):
+        # Statuses are stored upper-case; an exact match can use the status indexes, iexact cannot.
+        return queryset.filter(status=value.upper())
+
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = OrderFilter
+    pagination_class = OrderPagination
 
     def get_queryset(self):
         user = self.request.user
+        queryset = OrderSerializer.setup_eager_loading(Order.objects.order_by('-created_at'))
         if user.role == User.Role.ADMIN or user.role == User.Role.WAREHOUSE:
-            return Order.objects.all().order_by('-created_at')
-        return Order.objects.filter(created_by=user).order_by('-created_at')
+            return queryset
+        return queryset.filter(created_by=user)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -170,10 +330,20 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         serializer.save()
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.refresh_from_db(from_queryset=Order.objects.select_for_update())
+            if instance.status in LOCKED_STATES:
+                locked = order_quantities(instance)
+                apply_stock_deltas({}, locked={pid: -qty for pid, qty in locked.items()})
+            before = order_state(instance)
+            instance.delete()
+            order_changed(before, None)
+
     @action(detail=True, methods=['post'])
     def status_update(self, request, pk=None):
         """
-        Handle State Transitions.
+        Handle State Transitions; the rules and stock effects live in core.workflow.
         Admin can facilitate any transition (Next/Prev).
         Stock Logic:
         - HOLDING States (Stock Deducted): PENDING_APPROVAL, APPROVED, PACKED, OUT_FOR_DELIVERY, DELIVERED, SETTLED
@@ -191,73 +361,66 @@ class OrderViewSet(viewsets.ModelViewSet):
         if new_status not in Order.Status.values:
              return Response({"error": f"Invalid status: {new_status}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Permission Logic
-        # Admin can do anything.
-        # Others might have restrictions, but for this request "admin should have access..." allows broad admin rights.
-        # We'll enforce basic role checks for non-admins if needed, but assuming mostly Admin/System usage for status moves in this context.
-        if user.role != User.Role.ADMIN:
-             # Sales Rep Transition Rules
-             if user.role == User.Role.SALES_REP:
-                 allowed_transitions = {
-                     Order.Status.DRAFT: [Order.Status.PENDING_APPROVAL],
-                     Order.Status.PENDING_APPROVAL: [Order.Status.DRAFT],
-                     Order.Status.PACKED: [Order.Status.OUT_FOR_DELIVERY],
-                     Order.Status.OUT_FOR_DELIVERY: [Order.Status.DELIVERED],
-                 }
-                 
-                 allowed_targets = allowed_transitions.get(order.status, [])
-                 if new_status not in allowed_targets:
-                      return Response({"error": f"Sales Rep cannot transition from {order.status} to {new_status}"}, status=status.HTTP_403_FORBIDDEN)
-             
-             # Warehouse Transition Rules (Generic, can be refined later if needed)
-             elif user.role == User.Role.WAREHOUSE:
-                  # Warehouse mainly moves Approved -> Packed
-                  if order.status == Order.Status.APPROVED and new_status == Order.Status.PACKED:
-                      pass
-                  else:
-                      return Response({"error": "Warehouse can only pack approved orders (MVP Rule)"}, status=status.HTTP_403_FORBIDDEN)
-             
-             else:
-                  # Fallback for other roles?
-                  pass
-
-        old_status = order.status
-        
-        # Define State Categories
-        HOLDING_STATES = [
-            Order.Status.PENDING_APPROVAL, 
-            Order.Status.APPROVED, 
-            Order.Status.PACKED, 
-            Order.Status.OUT_FOR_DELIVERY, 
-            Order.Status.DELIVERED, 
-            Order.Status.SETTLED
-        ]
-        FREE_STATES = [Order.Status.DRAFT, Order.Status.REJECTED]
+        try:
+            stock_result = transition_order(order, new_status, user)
+        except TransitionNotAllowed as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_403_FORBIDDEN)
+        except InsufficientStock as exc:
+            raise serializers.ValidationError(exc.messages)
 
-        with transaction.atomic():
-            # Logic: FREE -> HOLDING (Deduct)
-            if old_status in FREE_STATES and new_status in HOLDING_STATES:
-                for item in order.items.select_related('product').all():
-                    # Check stock first
-                    if item.product.stock_quantity < item.quantity:
-                         raise serializers.ValidationError(f"Insufficient stock for {item.product.name}. Available: {item.product.stock_quantity}")
-                    item.product.stock_quantity -= item.quantity
-                    item.product.save()
-            
-            # Logic: HOLDING -> FREE (Restore)
-            elif old_status in HOLDING_STATES and new_status in FREE_STATES:
-                for item in order.items.select_related('product').all():
-                    item.product.stock_quantity += item.quantity
-                    item.product.save()
-            
-            # Logic: HOLDING -> HOLDING (No stock change)
-            # Logic: FREE -> FREE (No stock change)
-
-            order.status = new_status
-            order.save()
-
-
-        return Response(OrderSerializer(order).data)
+        response = Response(OrderSerializer(order).data)
+        if stock_result:
+            response['Server-Timing'] = f"stock;dur={stock_result.elapsed_ms:.2f}"
+        return response
+
+    @action(detail=True, methods=['get'])
+    def transitions(self, request, pk=None):
+        """The statuses the current user may move this order to, with their stock effect."""
+        order = self.get_object()
+        return Response({
+            'id': order.pk,
+            'status': order.status,
+            'next': [
+                {
+                    'status': new_status,
+                    'stock': get_transition(request.user, order.status, new_status).stock,
+                    'locked': get_transition(request.user, order.status, new_status).locked,
+                }
+                for new_status in next_states(request.user, order.status)
+            ],
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk_status_update(self, request):
+        """
+        Move many orders to one status: {"ids": [...], "status": "PACKED"}.
+        Each order is checked with the same rules as status_update and succeeds or fails
+        on its own; the response lists {id, ok, old_status, status, error} per order.
+        """
+        new_status = request.data.get('status')
+        ids = request.data.get('ids')
+        if new_status not in Order.Status.values:
+            return Response({"error": f"Invalid status: {new_status}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+            return Response({"error": "ids must be a non-empty list of order ids"}, status=status.HTTP_400_BAD_REQUEST)
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > settings.BULK_TRANSITION_MAX_ORDERS:
+            return Response(
+                {"error": f"At most {settings.BULK_TRANSITION_MAX_ORDERS} orders per request"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        started = time.perf_counter()
+        results = bulk_transition(self.get_queryset(), ids, new_status, request.user)
+        updated = sum(1 for result in results if result['ok'])
+        response = Response({
+            'status': new_status,
+            'updated': updated,
+            'failed': len(results) - updated,
+            'results': results,
+        })
+        response['Server-Timing'] = f"transition;dur={(time.perf_counter() - started) * 1000:.2f}"
+        return response
 
     @action(detail=True, methods=['post'])
     def generate_invoice(self, request, pk=None):
@@ -266,89 +429,284 @@ class OrderViewSet(viewsets.ModelViewSet):
         if order.status != Order.Status.APPROVED:
              return Response({"error": "Order must be APPROVED to generate invoice"}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check against last invoice
-        last_invoice = order.invoices.order_by('-created_at').first()
-        if last_invoice and order.updated_at <= last_invoice.created_at:
-             return Response(InvoiceSerializer(last_invoice).data)
-
-        # Calculate totals
-        subtotal = sum(item.product.selling_price * item.quantity for item in order.items.all())
-        discount_amount = subtotal * (order.discount_percentage / 100)
-        total = subtotal - discount_amount
-        
-        current_data = {
-            'order_id': order.id,
-            'customer_name': order.customer.name if order.customer else "Guest",
-            'customer_phone': order.customer.phone_number if order.customer else "",
-            'customer_address': order.customer.address if order.customer else "",
-            'sales_rep': order.created_by.get_full_name() or order.created_by.username,
-            'issued_at': timezone.now().isoformat(),
-            'items': [
-                {
-                    'sku': item.product.sku,
-                    'category': item.product.category,
-                    'quantity': item.quantity,
-                    'unit_price': str(item.product.selling_price),
-                    'total': str(item.product.selling_price * item.quantity)
-                }
-                for item in order.items.select_related('product').all()
-            ],
-            'subtotal': str(subtotal),
-            'discount_percentage': str(order.discount_percentage),
-            'discount_amount': str(discount_amount),
-            'total': str(total),
-            'currency': 'EGP'
-        }
-        
-        # Generate New
-        count = order.invoices.count() + 1
-        inv_num = f"INV-{order.id}-{count:02d}"
-        
-        invoice = Invoice.objects.create(
-            order=order,
-            invoice_number=inv_num,
-            invoice_data=current_data
-        )
+        # Reuses the last invoice if the order hasn't changed; rendering happens in run_invoice_worker.
+        invoice, created = issue_invoice(order)
         return Response(InvoiceSerializer(invoice).data)
     
+    @action(detail=False, methods=['post'])
+    def generate_invoices(self, request):
+        """
+        Issue invoices for many APPROVED orders at once.
+        Body: {"ids": [...]} or {"filters": {OrderFilter params, e.g. created_at_after, customer, city}}.
+        Streams NDJSON: one line per order, a progress line per chunk, and a final summary.
+        """
+        if request.user.role not in (User.Role.ADMIN, User.Role.WAREHOUSE):
+            return Response({"error": "Only Admin or Warehouse can generate invoices in bulk"}, status=status.HTTP_403_FORBIDDEN)
+
+        ids = request.data.get('ids')
+        queryset = self.get_queryset()
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                return Response({"error": "ids must be a list of order ids"}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(pk__in=ids)
+        else:
+            filterset = OrderFilter(request.data.get('filters') or {}, queryset=queryset, request=request)
+            if not filterset.is_valid():
+                return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+            queryset = filterset.qs
+
+        order_ids = list(queryset.order_by('id').values_list('id', 'status'))
+        # One line at a time, so progress reaches the client as each chunk is issued.
+        return streaming_response(
+            request,
+            self._generate_invoices_stream(order_ids),
+            'application/x-ndjson',
+            batch_size=1,
+        )
+
+    def _generate_invoices_stream(self, order_ids):
+        chunk_size = settings.INVOICE_BATCH_CHUNK_SIZE
+        approved = [pk for pk, order_status in order_ids if order_status == Order.Status.APPROVED]
+        summary = {'total': len(order_ids), 'created': 0, 'reused': 0, 'skipped': len(order_ids) - len(approved)}
+
+        for pk, order_status in order_ids:
+            if order_status != Order.Status.APPROVED:
+                yield json.dumps({'order_id': pk, 'error': "Order must be APPROVED to generate invoice"}) + "\n"
+
+        for start in range(0, len(approved), chunk_size):
+            chunk = Order.objects.filter(pk__in=approved[start:start + chunk_size]).select_related('customer', 'created_by').order_by('id')
+            with transaction.atomic():
+                results = issue_invoices(list(chunk))
+            for order, invoice, created in results:
+                summary['created' if created else 'reused'] += 1
+                yield json.dumps({'order_id': order.pk, 'invoice_id': invoice.pk, 'invoice_number': invoice.invoice_number, 'created': created}) + "\n"
+            yield json.dumps({'progress': min(start + chunk_size, len(approved)), 'of': len(approved)}) + "\n"
+
+        yield json.dumps({'summary': summary}) + "\n"
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream orders with their line items, filtered like the list (created_at_after/_before,
+        status, customer, created_by, city): ?fmt=csv gives one row per line, ?fmt=ndjson one
+        object per order.
+        """
+        return self._export('orders', request)
+
+    @action(detail=False, methods=['get'], url_path='invoices/export')
+    def export_invoices(self, request):
+        """Stream the invoices of the orders matching the list filters, ?fmt=csv|ndjson."""
+        return self._export('invoices', request)
+
+    def _export(self, name, request):
+        fmt = requested_format(request)
+        if fmt not in EXPORT_FORMATS:
+            return Response({"error": f"fmt must be one of {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(request, name, self.filter_queryset(self.get_queryset()), fmt)
+
     @action(detail=True, methods=['get'])
     def invoices(self, request, pk=None):
         order = self.get_object()
         invoices = order.invoices.all().order_by('-created_at')
         return Response(InvoiceSerializer(invoices, many=True).data)
 
+    @action(detail=True, methods=['get'], url_path=r'invoices/(?P<invoice_id>\d+)/document')
+    def invoice_document(self, request, pk=None, invoice_id=None):
+        order = self.get_object()
+        invoice = get_object_or_404(order.invoices, pk=invoice_id)
+        if invoice.render_status != Invoice.RenderStatus.DONE or not invoice.document:
+            return Response(
+                {"render_status": invoice.render_status, "error": invoice.render_error or None},
+                status=status.HTTP_202_ACCEPTED,
+            )
+        return FileResponse(invoice.document.open('rb'), content_type='text/html', filename=invoice.document.name.split('/')[-1])
+
 class DashboardStatsViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
+    def list(self, request):
+        # Served from OrderStatusRollup (kept current by order writes) behind a short TTL cache.
+        return Response(dashboard_stats(request.user))
+
+class SalesAnalyticsViewSet(viewsets.ViewSet):
+    """
+    Sales by day/week/month, sliced by sales rep, city and category, read from the
+    daily fact tables (see SalesAnalyticsQuerySerializer for the parameters).
+    Sales reps only see their own sales and no cost or margin.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
     def list(self, request):
         user = request.user
-        
-        # Base Query for Revenue
-        revenue_qs = Order.objects.filter(status=Order.Status.SETTLED)
-        pending_qs = Order.objects.filter(status=Order.Status.PENDING_APPROVAL)
-        
-        # Filter for Sales Rep
+        if user.role == User.Role.WAREHOUSE:
+            return Response({"error": "Sales analytics are for Admin and Sales Reps"}, status=status.HTTP_403_FORBIDDEN)
+        params = SalesAnalyticsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = dict(params.validated_data)
         if user.role == User.Role.SALES_REP:
-            revenue_qs = revenue_qs.filter(created_by=user)
-            pending_qs = pending_qs.filter(created_by=user)
+            query['sales_rep'] = user.pk
 
-        # Cash on Hand: Orders that are DELIVERED but not yet SETTLED
-        # Logic: Status=DELIVERED is the state before SETTLED.
-        cash_qs = Order.objects.filter(status=Order.Status.DELIVERED)
-        if user.role == User.Role.SALES_REP:
-            cash_qs = cash_qs.filter(created_by=user)
+        started = time.perf_counter()
+        results = sales_report(**query)
+        if user.role != User.Role.ADMIN:
+            for row in results:
+                del row['cost'], row['margin']
+        response = Response({
+            'interval': query['interval'],
+            'group_by': query['group_by'],
+            'date_from': query['date_from'],
+            'date_to': query['date_to'],
+            'results': results,
+        })
+        response['Server-Timing'] = f"analytics;dur={(time.perf_counter() - started) * 1000:.2f}"
+        return response
 
-        total_revenue = revenue_qs.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        pending_orders = pending_qs.count()
-        cash_on_hand = cash_qs.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        
-        low_stock_count = Product.objects.filter(stock_quantity__lt=10).count()
-        
+
+class ProfitabilityViewSet(viewsets.ViewSet):
+    """
+    Gross margin per order, product, category or sales rep, net of order discounts
+    (see ProfitabilityQuerySerializer for the parameters). Admin only: it exposes
+    cost_price, which ProductSerializer hides from everyone else.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        if request.user.role != User.Role.ADMIN:
+            return Response({"error": "Only Admin can view profitability"}, status=status.HTTP_403_FORBIDDEN)
+        params = ProfitabilityQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        try:
+            totals, results, timings = profitability_report(**query)
+        except ReportUnavailable as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response = Response({
+            'group_by': query['group_by'],
+            'date_from': query['date_from'],
+            'date_to': query['date_to'],
+            'sort': query['sort'],
+            'totals': totals,
+            'results': results,
+        })
+        response['Server-Timing'] = ', '.join(f"{name};dur={ms:.2f}" for name, ms in timings.items())
+        return response
+
+
+async def event_stream(request):
+    """
+    Server-Sent Events: GET /api/events/?token=<auth token> streams order.status,
+    product.stock and invoice.created events as they are committed, filtered like the
+    order list (reps only get their own orders' events). EventSource cannot set headers,
+    so the token may come as a query parameter; an Authorization: Token header works too.
+    Reconnects resume after the Last-Event-ID header (or ?last_event_id=).
+    """
+    header = request.headers.get('Authorization', '')
+    key = header[len('Token '):] if header.startswith('Token ') else request.GET.get('token')
+    token = await Token.objects.select_related('user').filter(key=key or '').afirst()
+    if token is None or not token.user.is_active:
+        return JsonResponse({"error": "A valid token is required"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if last_id is not None:
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            return JsonResponse({"error": "last_event_id must be an event id"}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        last_id = await latest_event_id()
+
+    response = StreamingHttpResponse(stream_events(token.user, last_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Proxies such as nginx would otherwise buffer the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """
+    Incremental catalog sync for mobile clients.
+    GET /api/sync/?since=<watermark> returns products and customers created or updated
+    since the watermark plus the ids deleted since then. Omit `since` for a full load.
+    Each page holds up to ?limit= (SYNC_PAGE_SIZE) products and as many customers; while
+    `next` is set, call again with ?cursor=<next> for the rest. The last page carries the
+    `watermark`: store it and send it back as `since` on the next sync.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        try:
+            limit = int(request.query_params.get('limit', settings.SYNC_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+            return Response(
+                {"error": f"limit must be between 1 and {settings.API_MAX_PAGE_SIZE}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        token = request.query_params.get('cursor')
+        if token:
+            # The cursor carries the sync's since/watermark and where each table left off;
+            # tables missing from `after` are done.
+            try:
+                state = decode_cursor(token)
+                since = parse_datetime(state['since']) if state['since'] else None
+                watermark = parse_datetime(state['watermark'])
+                after = dict(state['after'])
+            except (InvalidCursor, KeyError, TypeError, ValueError):
+                return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            since = request.query_params.get('since')
+            if since:
+                # An unencoded "+00:00" offset arrives as a space.
+                since = parse_datetime(since.replace(' ', '+'))
+                if since is None:
+                    return Response({"error": "since must be an ISO 8601 timestamp"}, status=status.HTTP_400_BAD_REQUEST)
+                if timezone.is_naive(since):
+                    since = timezone.make_aware(since, datetime.timezone.utc)
+            # Rows saved by transactions still in flight carry an updated_at just before now;
+            # handing out a slightly older watermark makes the next sync pick them up.
+            watermark = timezone.now() - datetime.timedelta(seconds=settings.SYNC_WATERMARK_OVERLAP)
+            after = {'products': None, 'customers': None}
+
+        tables = {
+            'products': (Product.objects.all(), ProductSerializer, Tombstone.Kind.PRODUCT),
+            'customers': (Customer.objects.all(), SyncCustomerSerializer, Tombstone.Kind.CUSTOMER),
+        }
+        context = {'request': request}
+        body = {}
+        remaining = {}
+        for name, (queryset, serializer_class, kind) in tables.items():
+            rows = []
+            if name in after:
+                if since:
+                    queryset = queryset.filter(updated_at__gt=since)
+                try:
+                    rows, position = updated_since_page(queryset, after[name], limit)
+                except (InvalidCursor, IndexError, TypeError, ValueError):
+                    return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+                if position is not None:
+                    remaining[name] = position
+            # Deletions only matter to a client that already holds rows; sent once, on the first page.
+            deleted = []
+            if since and not token:
+                deleted = list(
+                    Tombstone.objects.filter(kind=kind, deleted_at__gt=since).order_by('id').values_list('object_id', flat=True)
+                )
+            body[name] = {'updated': serializer_class(rows, many=True, context=context).data, 'deleted': deleted}
+
+        next_token = None
+        if remaining:
+            next_token = encode_cursor({
+                'since': since.isoformat() if since else None,
+                'watermark': watermark.isoformat(),
+                'after': remaining,
+            })
         return Response({
-            'total_revenue': total_revenue,
-            'pending_orders': pending_orders,
-            'low_stock_items': low_stock_count,
-            'cash_on_hand': cash_on_hand
+            'watermark': None if next_token else watermark.isoformat(),
+            'next': next_token,
+            **body,
         })
 
 class CustomAuthToken(ObtainAuthToken):
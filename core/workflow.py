@@ -0,0 +1,217 @@
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models.functions import Now
+
+from .events import publish_transitions
+from .models import InventoryMovement, Order, OrderItem, User
+from .response_cache import bump_cache_version
+from .rollups import order_state, orders_changed
+from .stock import apply_stock_deltas, line_totals, lock_products, locked_direction, order_quantities, stock_direction
+
+# Admin can make any transition; reps only move their orders along these edges.
+SALES_REP_TRANSITIONS = {
+    Order.Status.DRAFT: [Order.Status.PENDING_APPROVAL],
+    Order.Status.PENDING_APPROVAL: [Order.Status.DRAFT],
+    Order.Status.PACKED: [Order.Status.OUT_FOR_DELIVERY],
+    Order.Status.OUT_FOR_DELIVERY: [Order.Status.DELIVERED],
+}
+
+# One cell of the transition matrix. `stock`/`locked` are the signs applied to the
+# order's quantities: -1 takes stock (or releases the lock), +1 returns it, 0 leaves it.
+Transition = namedtuple('Transition', ['allowed', 'error', 'stock', 'locked'])
+
+
+class TransitionNotAllowed(Exception):
+    pass
+
+
+def _role_error(role, old_status, new_status):
+    if role == User.Role.SALES_REP:
+        if new_status not in SALES_REP_TRANSITIONS.get(old_status, []):
+            return f"Sales Rep cannot transition from {old_status} to {new_status}"
+    elif role == User.Role.WAREHOUSE:
+        # Warehouse mainly moves Approved -> Packed
+        if not (old_status == Order.Status.APPROVED and new_status == Order.Status.PACKED):
+            return "Warehouse can only pack approved orders (MVP Rule)"
+    return None
+
+
+def _compile():
+    transitions, next_states = {}, {}
+    for role in User.Role.values:
+        for old_status in Order.Status.values:
+            for new_status in Order.Status.values:
+                error = _role_error(role, old_status, new_status)
+                transitions[(role, old_status, new_status)] = Transition(
+                    allowed=error is None,
+                    error=error,
+                    stock=stock_direction(old_status, new_status),
+                    locked=locked_direction(old_status, new_status),
+                )
+            next_states[(role, old_status)] = tuple(
+                new_status for new_status in Order.Status.values
+                if new_status != old_status and transitions[(role, old_status, new_status)].allowed
+            )
+    return transitions, next_states
+
+
+# (role, from, to) -> Transition and (role, from) -> allowed targets, built once at import.
+TRANSITIONS, NEXT_STATES = _compile()
+
+# Called as hook(changes) with the [(before, after)] OrderState pairs of every order a
+# transition moved, inside its transaction and after the status write.
+TRANSITION_HOOKS = [orders_changed, publish_transitions]
+
+
+def register_transition_hook(hook):
+    """Add a batch hook run after every single or bulk transition; usable as a decorator."""
+    TRANSITION_HOOKS.append(hook)
+    return hook
+
+
+def run_transition_hooks(changes):
+    if changes:
+        for hook in TRANSITION_HOOKS:
+            hook(changes)
+
+
+def get_transition(user, old_status, new_status):
+    return TRANSITIONS[(user.role, old_status, new_status)]
+
+
+def transition_error(user, old_status, new_status):
+    """Why `user` may not move an order from `old_status` to `new_status`, or None if they may."""
+    return TRANSITIONS[(user.role, old_status, new_status)].error
+
+
+def next_states(user, status):
+    """The statuses `user` may move an order in `status` to."""
+    return NEXT_STATES[(user.role, status)]
+
+
+def transition_deltas(step, quantities):
+    """(stock deltas, locked deltas) of a Transition for an order with `quantities`."""
+    stock = {pid: step.stock * qty for pid, qty in quantities.items()} if step.stock else {}
+    locked = {pid: step.locked * qty for pid, qty in quantities.items()} if step.locked else {}
+    return stock, locked
+
+
+def transition_order(order, new_status, user):
+    """
+    Move one order to `new_status`. The order is locked and re-read first, so of two
+    concurrent requests for the same order the second sees the first one's status.
+    Raises TransitionNotAllowed or InsufficientStock; returns the StockResult, or None
+    when the transition leaves stock alone.
+    """
+    stock_result = None
+    with transaction.atomic():
+        order.refresh_from_db(from_queryset=Order.objects.select_for_update())
+        old_status = order.status
+        step = get_transition(user, old_status, new_status)
+        if not step.allowed:
+            raise TransitionNotAllowed(step.error)
+
+        before = order_state(order)
+        stock_deltas, locked_deltas = transition_deltas(step, order_quantities(order))
+        if stock_deltas or locked_deltas:
+            stock_result = apply_stock_deltas(
+                stock_deltas, locked=locked_deltas, order=order, user=user,
+                reference=f"{old_status} -> {new_status}",
+            )
+        order.status = new_status
+        order.save()
+        run_transition_hooks([(before, order_state(order))])
+    return stock_result
+
+
+def bulk_transition(queryset, order_ids, new_status, user):
+    """
+    Move the orders of `queryset` with ids `order_ids` to `new_status` in one transaction.
+
+    Each order is checked against the same role rules as a single status change and
+    fails on its own; the rest still move. Orders that take stock are allocated greedily
+    in id order, so an order is only refused when what is left after the earlier ones
+    does not cover it. The combined stock change goes out as one update per product
+    batch, all accepted orders get their new status in one UPDATE, and the hooks run
+    once for the whole batch.
+
+    Returns one {id, ok, old_status, status, error} dict per requested id, in request order.
+    """
+    results = {}
+    with transaction.atomic():
+        # Orders first, then products in SKU order: the same lock order as transition_order.
+        orders = list(
+            Order.objects.select_for_update()
+            .filter(pk__in=queryset.filter(pk__in=order_ids).values('pk'))
+            .order_by('pk')
+        )
+        candidates = []
+        for order in orders:
+            step = get_transition(user, order.status, new_status)
+            if not step.allowed:
+                results[order.pk] = _result(order, ok=False, error=step.error)
+            elif order.status == new_status:
+                results[order.pk] = _result(order, ok=True)
+            else:
+                candidates.append((order, step))
+
+        lines = defaultdict(list)
+        items = OrderItem.objects.filter(order__in=[order.pk for order, _ in candidates])
+        for order_id, product_id, quantity in items.values_list('order_id', 'product_id', 'quantity'):
+            lines[order_id].append((product_id, quantity))
+        deltas = {order.pk: transition_deltas(step, line_totals(lines[order.pk])) for order, step in candidates}
+
+        product_ids = {pid for stock, locked in deltas.values() for pid in (*stock, *locked)}
+        products = {row['id']: row for row in lock_products(product_ids)}
+
+        accepted = []
+        stock_total, locked_total = defaultdict(int), defaultdict(int)
+        movements = []
+        for order, _ in candidates:
+            stock, locked = deltas[order.pk]
+            short = [
+                products[pid] for pid, change in sorted(stock.items())
+                if change < 0 and products[pid]['stock_quantity'] < -change
+            ]
+            if short:
+                error = "; ".join(f"Insufficient stock for {p['name']}. Available: {p['stock_quantity']}" for p in short)
+                results[order.pk] = _result(order, ok=False, error=error)
+                continue
+            for pid, change in stock.items():
+                products[pid]['stock_quantity'] += change
+                stock_total[pid] += change
+                movements.append(InventoryMovement(
+                    product_id=pid,
+                    kind=InventoryMovement.Kind.RELEASE if change > 0 else InventoryMovement.Kind.RESERVATION,
+                    quantity=change,
+                    order=order,
+                    user=user,
+                    reference=f"{order.status} -> {new_status}",
+                ))
+            for pid, change in locked.items():
+                locked_total[pid] += change
+            accepted.append(order)
+
+        if stock_total or locked_total:
+            # Every order was checked against the locked rows above, so this cannot fall short.
+            apply_stock_deltas(stock_total, locked=locked_total, movements=movements)
+
+        if accepted:
+            Order.objects.filter(pk__in=[order.pk for order in accepted]).update(status=new_status, updated_at=Now())
+            changes = []
+            for order in accepted:
+                before = order_state(order)
+                old_status, order.status = order.status, new_status
+                changes.append((before, order_state(order)))
+                results[order.pk] = _result(order, ok=True, old_status=old_status)
+            run_transition_hooks(changes)
+
+    return [results.get(order_id) or {'id': order_id, 'ok': False, 'error': "Order not found"} for order_id in order_ids]
+
+
+def _result(order, ok, old_status=None, error=None):
+    result = {'id': order.pk, 'ok': ok, 'old_status': old_status or order.status, 'status': order.status}
+    if error:
+        result['error'] = error
+    return result
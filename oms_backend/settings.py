@@ -72,6 +72,15 @@ DATABASES = {
     )
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # SQLite has no row locks: take the write lock at BEGIN (instead of failing on the
+    # read-to-write upgrade) and use WAL so readers are not blocked by the writer.
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+    })
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
@@ -113,7 +122,68 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.CursorOrOffsetPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', '50')),
+}
+
+# Upper bound for ?page_size= / ?limit= on list endpoints
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', '500'))
+
+# Cache (per-process by default; point CACHE_BACKEND at a shared backend to share entries between workers).
+# Cached list responses are safe either way: their version counters live in the database.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'oms-default'),
+    }
 }
 
+# Seconds a dashboard snapshot may be served before it is rebuilt from the rollup table
+DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL', '30'))
+
+# Seconds a cached catalog/customer list response may be served (model changes invalidate sooner)
+API_CACHE_TTL = int(os.environ.get('API_CACHE_TTL', '300'))
+
+# Seconds the /api/sync/ watermark trails the server clock, so rows committed late are not skipped
+SYNC_WATERMARK_OVERLAP = int(os.environ.get('SYNC_WATERMARK_OVERLAP', '30'))
+# Products and customers per /api/sync/ page (?limit= may ask for up to API_MAX_PAGE_SIZE)
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', '500'))
+
+# Invoice rendering queue (manage.py run_invoice_worker)
+INVOICE_RENDER_LEASE = int(os.environ.get('INVOICE_RENDER_LEASE', '300'))  # seconds before a stuck job is retried
+INVOICE_RENDER_MAX_ATTEMPTS = int(os.environ.get('INVOICE_RENDER_MAX_ATTEMPTS', '3'))
+INVOICE_BATCH_CHUNK_SIZE = int(os.environ.get('INVOICE_BATCH_CHUNK_SIZE', '200'))  # orders per transaction in generate_invoices
+
+# Rows fetched per database round trip by the streaming CSV/NDJSON exports
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Products upserted per INSERT ... ON CONFLICT statement by the bulk catalog import
+PRODUCT_IMPORT_CHUNK_SIZE = int(os.environ.get('PRODUCT_IMPORT_CHUNK_SIZE', 1000))
+
+# Largest batch accepted by POST /api/products/stock-adjustments/
+STOCK_ADJUSTMENT_MAX_LINES = int(os.environ.get('STOCK_ADJUSTMENT_MAX_LINES', 20000))
+
+# Largest batch accepted by POST /api/orders/bulk_status_update/
+BULK_TRANSITION_MAX_ORDERS = int(os.environ.get('BULK_TRANSITION_MAX_ORDERS', 1000))
+
+# In-process product suggest index: how often each process catches up on other processes' writes
+SUGGEST_REFRESH_INTERVAL = int(os.environ.get('SUGGEST_REFRESH_INTERVAL', 60))
+
+# Reorder suggestions (rebuild_reorder_suggestions): days of order history behind the
+# velocity, supplier lead time, days of demand a reorder should cover, and the safety
+# stock z-score applied to the daily demand's standard deviation
+REORDER_HISTORY_DAYS = int(os.environ.get('REORDER_HISTORY_DAYS', 56))
+REORDER_LEAD_TIME_DAYS = int(os.environ.get('REORDER_LEAD_TIME_DAYS', 7))
+REORDER_COVER_DAYS = int(os.environ.get('REORDER_COVER_DAYS', 30))
+REORDER_SAFETY_Z = float(os.environ.get('REORDER_SAFETY_Z', 1.65))
+
+# Server-Sent Events (/api/events/): how often streams re-read the events table without
+# Postgres LISTEN/NOTIFY, the keep-alive interval, how long one stream stays open before
+# the client reconnects, and how long prune_events keeps events
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 2))
+EVENT_HEARTBEAT_INTERVAL = int(os.environ.get('EVENT_HEARTBEAT_INTERVAL', 15))
+EVENT_STREAM_MAX_AGE = int(os.environ.get('EVENT_STREAM_MAX_AGE', 300))
+EVENT_RETENTION_DAYS = int(os.environ.get('EVENT_RETENTION_DAYS', 7))
+
 # CORS
 CORS_ALLOW_ALL_ORIGINS = True # For development